@@ -0,0 +1,131 @@
+from pathlib import Path
+import itertools
+import argparse
+import json
+import os
+import yaml
+
+rootDir = Path(__file__).parent.parent
+matrixFile = Path(__file__).parent/"experiments.yml"
+# variabile d'ambiente con cui run_load_test passa la configurazione al locustfile
+ENV_VAR = "SOY_EXPERIMENT"
+# porta dell'exporter Prometheus di Locust (diversa per ogni slot in esecuzione parallela)
+METRICS_PORT_VAR = "SOY_METRICS_PORT"
+# bucket degli istogrammi di latenza (chiave latency_buckets della configurazione)
+LATENCY_BUCKETS_VAR = "SOY_LATENCY_BUCKETS"
+
+
+def expand(spec):
+    """
+    Espande una matrice di esperimenti nelle singole configurazioni.
+
+    Args:
+        spec (dict): Matrice con le chiavi "base" e "groups" (vedi config/experiments.yml)
+
+    Returns:
+        dict: Mapping nome esperimento -> configurazione (non ancora risolta, vedi resolve)
+    """
+    experiments = {}
+    for group in spec.get("groups", []):
+        matrix = group.get("matrix", {})
+        keys = list(matrix.keys())
+        for values in itertools.product(*(matrix[k] for k in keys)):
+            conf = dict(spec.get("base", {}))
+            conf.update(group.get("conf", {}))
+            conf.update(zip(keys, values))
+            conf.setdefault("replicas", conf.get("init_repica", 1))
+            name = group["name"].format(**conf)
+            if name in experiments:
+                raise ValueError(f"Duplicate experiment name in matrix: {name}")
+            experiments[name] = conf
+    return experiments
+
+
+def load(path=matrixFile):
+    with open(path) as f:
+        return expand(yaml.safe_load(f))
+
+
+def resolve(name, conf):
+    """
+    Converte i percorsi relativi della configurazione nei percorsi usati da ControlLoop.
+    """
+    conf = dict(conf)
+    conf["name"] = name
+    conf["sysfile"] = rootDir/"sou"/conf["sysfile"]
+    conf["outfile"] = rootDir/"results"/name/f"{name}.csv"
+    return conf
+
+
+def get_experiment(name, path=matrixFile):
+    """
+    Returns the resolved configuration of one experiment of the matrix.
+
+    Raises:
+        KeyError: If the experiment is not defined
+    """
+    experiments = load(path)
+    if name not in experiments:
+        raise KeyError(f"Experiment '{name}' not found in {path}")
+    return resolve(name, experiments[name])
+
+
+def apply_overrides(conf, overrides):
+    """
+    Applica una lista di assegnamenti "chiave=valore" alla configurazione.
+    Le chiavi possono essere annidate con il punto (es. prometheus.port=9190);
+    il valore e' interpretato come JSON e, se non valido, come stringa.
+
+    Returns:
+        dict: Nuova configurazione
+    """
+    conf = json.loads(json.dumps(conf, default=str))
+    for override in overrides or []:
+        key, sep, raw = override.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid override '{override}', expected KEY=VALUE")
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        target = conf
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    conf["sysfile"] = Path(conf["sysfile"])
+    conf["outfile"] = Path(conf["outfile"])
+    return conf
+
+
+def to_env(conf):
+    return json.dumps(conf, default=str)
+
+
+def from_env():
+    """
+    Reads the configuration passed by run_load_test through the SOY_EXPERIMENT variable.
+    The variable holds either the JSON configuration or just an experiment name.
+    """
+    value = os.environ.get(ENV_VAR)
+    if not value:
+        raise RuntimeError(f"{ENV_VAR} is not set: run the experiment through run_load_test.py --experiment")
+    if not value.lstrip().startswith("{"):
+        return get_experiment(value)
+    conf = json.loads(value)
+    conf["sysfile"] = Path(conf["sysfile"])
+    conf["outfile"] = Path(conf["outfile"])
+    return conf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the experiments of the matrix")
+    parser.add_argument("--matrix", type=str, default=str(matrixFile), help="Matrix file")
+    parser.add_argument("--field", nargs=2, metavar=("EXPERIMENT", "KEY"),
+                        help="Print one configuration value of an experiment")
+    args = parser.parse_args()
+    if args.field:
+        print(get_experiment(args.field[0], args.matrix)[args.field[1]])
+    else:
+        for name in sorted(load(args.matrix)):
+            print(name)
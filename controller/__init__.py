@@ -1,2 +1,4 @@
-from controller.controlqueuing import OPTCTRL  
-from controller.control_loop import ControlLoop
\ No newline at end of file
+from controller.controlqueuing import OPTCTRL, PersistentOPTCTRL
+from controller.runtime import ControlRuntime
+from controller.control_loop import ControlLoop
+from controller.scheduler import MultiRateScheduler
\ No newline at end of file
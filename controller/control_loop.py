@@ -1,11 +1,21 @@
-from estimator import QNEstimaator
+from estimator import RLSEstimator
 from estimator import Monitoring
-from controller import OPTCTRL
+from estimator import SwarmStateCache
+from controller import OPTCTRL, PersistentOPTCTRL
+from controller.runtime import ControlRuntime
+from controller.scheduler import MultiRateScheduler
+from prometheus_client import Gauge
 import time
 import numpy as np
 from pytimeparse.timeparse import timeparse
 import docker
 
+# Decisioni del controllore pubblicate dal greenlet del control loop (exporter di Locust)
+CONTROL_TICK = Gauge('soy_control_tick', 'Index of the last completed control tick')
+CONTROL_SERVICE_TIME = Gauge('soy_control_service_time_seconds', 'Service time estimated by the controller')
+CONTROL_REPLICAS = Gauge('soy_control_replicas', 'Replicas decided by the controller', ['service'])
+CONTROL_SOLVE_TIME = Gauge('soy_control_solve_time_seconds', 'Solve time of the last control decision')
+
 class ControlLoop():
 
     def __init__(self,config=None):
@@ -20,106 +30,279 @@ class ControlLoop():
             self.client = docker.from_env()
 
         self.estimator = None
+        self.serviceEstimator = None
         self.controller = None
-        self.monitoring = None
+        self.monitor = None
+        self.runtime = None
+        self.scheduler = None
+        # stato dello stack aggiornato dagli eventi docker, condiviso con il monitor
+        self.swarm = None
 
         self.cooldown = 3
-        self.suggestion = []
+        # suggerimenti recenti del controllore per servizio
+        self.suggestions = {}
+        # servizi controllati congiuntamente: lista di nomi o dict nome -> {"min": .., "max": ..}
+        self.services = config.get("services") or [config["service_name"]]
+        self.multi = len(self.services) > 1
+        if config.get("sla_percentile") is not None and config["sla_percentile"] not in Monitoring.QUANTILES:
+            raise ValueError(f"sla_percentile must be one of {Monitoring.QUANTILES}, got {config['sla_percentile']}")
+        self.stimes = None
+        # campioni (util, tr, util per servizio) misurati e non ancora passati allo stimatore
+        self.samples = []
 
-    '''TODO: devo ristrutturare il condice in modo tale che le misure
-            vengano prese ogni secondo, la stima fatta ogni n tick e il controllo ogni m tick
-    '''
     def loop(self,environment):
-        global initCore, estimator, controller
-        self.estimator=self.getEstimator()
-        self.controller=self.getController()
-        self.monitor=self.getMonitor()
+        # Il greenlet resta sull'hub di Locust: legge solo il tempo simulato e
+        # delega misura, stima e attuazione al runtime (thread pool)
+        self.runtime=self.getRuntime()
+        # il listener degli eventi va avviato dall'hub (sotto Locust e' un greenlet)
+        self.swarm=self.getSwarm()
+        self.runtime.call(self.setup)
+        # misura ad ogni periodo, stima ogni estimation_every tick, controllo ogni control_widow tick
+        self.scheduler=self.getScheduler()
         while not self.toStop:
+            tick, due=self.scheduler.wait()
+            if self.toStop:
+                break
             # Ottieni il tempo corrente.
             t=self.getSimTime(environment=environment)
-            try:
-                self.monitor.tick(t)
-                print(f"### tick = {t},ctrlTick = {self.ctrlTick} ###")
-
-                # Verifica che tutte le liste abbiano almeno un elemento prima di accedervi
-                if (len(self.monitor.rts) > 0 and len(self.monitor.tr) > 0 and
-                    len(self.monitor.replica) > 0 and len(self.monitor.ready_replica) > 0 and
-                    len(self.monitor.cores) > 0 and len(self.monitor.users) > 0 and
-                    len(self.monitor.active_users) > 0 and len(self.monitor.util) > 0):
-
-                    # Stampa formattata in più righe
-                    print(f"Response Time:  {self.monitor.rts[-1]}\n"
-                          f"Throughput:     {self.monitor.tr[-1]}\n"
-                          f"Replicas:       {self.monitor.replica[-1]}\n"
-                          f"Ready Replicas: {self.monitor.ready_replica[-1]}\n"
-                          f"Cores:          {self.monitor.cores[-1]}\n"
-                          f"WIP:            {self.monitor.users[-1]}\n"
-                          f"WIP_prom:       {self.monitor.active_users[-1]}\n"
-                          f"WIP_pred:       {self.monitor.predict_users(horizon=self.prediction_horizon)}\n"
-                          f"Util:           {self.monitor.util[-1]}\n"
-                          f"Mem:            {self.monitor.memory[-1]}")  # Corretto: memory invece di util
-                else:
-                    print(f"[WARNING] Dati del monitor non ancora disponibili o incompleti nel ciclo {self.ctrlTick}")
-            except Exception as e:
-                print(f"[ERROR] Errore durante il ciclo di controllo: {str(e)}")
-                # Continua l'esecuzione per provare nel prossimo ciclo
-            if(self.ctrlTick>self.config["estimation_window"] and
-               len(self.monitor.rts)>=self.config["estimation_window"]):
-                totalcores = np.array(self.monitor.cores[-self.config["estimation_window"]:]) * np.array(self.monitor.replica[-self.config["estimation_window"]:])
-                respnseTimes=np.array(self.monitor.rts[-self.config["estimation_window"]:])
-                wip=self.monitor.predict_users(horizon=self.prediction_horizon)
-                self.stime=self.monitor.util[-1]/self.monitor.tr[-1]
-                stealth=self.config["stealth"]
-                print(f"Service Time:  {self.stime} stealth={stealth}")
-
-            if((self.ctrlTick%self.config["control_widow"]==0) and self.stime is not None and self.stime>0):
-                wip=self.monitor.predict_users(horizon=self.prediction_horizon)
-                if(not self.config["stealth"]):
-                    replicas=self.controller.OPTController(e=[self.stime], tgt=[self.config["target_utilization"]], C=[float(wip)])
-                    self.addSuggestion(np.round(replicas))
-                    print(f"CTRL:          {np.round(replicas)}")
-                    self.actuate(np.round(replicas))
-
-            time.sleep(timeparse(self.config["measurament_period"]))
-            self.ctrlTick+=1
-
-    def addSuggestion(self,replica):
-        """
-        Aggiunge un nuovo valore all'array circolare delle suggestioni.
+            if self.runtime.submit(self.step, t, tick, due):
+                self.scheduler.executed(due)
+            else:
+                self.scheduler.skip("busy")
+            for decision in self.runtime.drain():
+                self.publish(decision)
+
+    def setup(self):
+        self.estimator=self.getEstimator()
+        # stimatore vettoriale per i servizi controllati congiuntamente
+        self.serviceEstimator=self.getEstimator() if self.multi else None
+        self.controller=self.getController()
+        self.monitor=self.getMonitor()
+
+    def step(self,t,tick=None,due=("measure","estimate","control")):
+        """
+        Esegue un tick di misura, stima e controllo. Contiene tutte le chiamate
+        bloccanti del loop e viene eseguito dal runtime fuori dall'hub gevent.
+
+        Args:
+            t (float): Tempo simulato del tick
+            tick (int, optional): Indice del tick dello scheduler (default: tick successivo)
+            due (set, optional): Attivita' da eseguire in questo tick ("measure", "estimate", "control")
+
+        Returns:
+            dict: Riepilogo del tick pubblicato sulla outbox del runtime
+        """
+        if tick is not None:
+            self.ctrlTick=tick
+        replicas=None
+        if "measure" in due:
+            self.measure(t)
+        if "estimate" in due:
+            self.estimate()
+        if "control" in due:
+            replicas=self.control()
+
+        tick=self.ctrlTick
+        self.ctrlTick+=1
+        return {"t": t, "tick": tick, "stime": self.stime,
+                "replicas": None if replicas is None else np.round(replicas).tolist(),
+                "solve_time": None if replicas is None else self.controller.solve_time}
+
+    def publish(self,decision):
+        """
+        Esporta su Prometheus il riepilogo di un tick ricevuto dalla outbox del runtime.
+        Eseguito sul greenlet del control loop, lato Locust.
+
+        Args:
+            decision (dict): Riepilogo restituito da step
+        """
+        CONTROL_TICK.set(decision["tick"])
+        if decision["stime"] is not None:
+            CONTROL_SERVICE_TIME.set(float(np.mean(decision["stime"])))
+        if decision["replicas"] is not None:
+            replicas=np.atleast_1d(decision["replicas"])
+            for service, replica in zip(self.services, replicas):
+                CONTROL_REPLICAS.labels(service=service).set(float(replica))
+            CONTROL_SOLVE_TIME.set(decision["solve_time"])
+
+    def measure(self,t):
+        count=self.monitor.store.count
+        try:
+            self.monitor.tick(t)
+            print(f"### tick = {t},ctrlTick = {self.ctrlTick} ###")
+
+            # Verifica che tutte le liste abbiano almeno un elemento prima di accedervi
+            if (len(self.monitor.rts) > 0 and len(self.monitor.tr) > 0 and
+                len(self.monitor.replica) > 0 and len(self.monitor.ready_replica) > 0 and
+                len(self.monitor.cores) > 0 and len(self.monitor.users) > 0 and
+                len(self.monitor.active_users) > 0 and len(self.monitor.util) > 0):
+
+                # campione per la stima solo se questo tick ne ha aggiunto uno nuovo
+                # (altrimenti si ripeterebbe l'ultimo e la stima RLS ne verrebbe distorta)
+                if self.monitor.store.count > count:
+                    self.samples.append((self.monitor.util[-1], self.monitor.tr[-1],
+                                         [self.monitor.service_util[s][-1] for s in self.services] if self.multi else None))
+
+                # Stampa formattata in più righe
+                print(f"Response Time:  {self.monitor.rts[-1]}\n"
+                      f"RT p50/p95/p99: {self.monitor.rt_p50[-1]:.3f}/{self.monitor.rt_p95[-1]:.3f}/{self.monitor.rt_p99[-1]:.3f}\n"
+                      f"Throughput:     {self.monitor.tr[-1]}\n"
+                      f"Replicas:       {self.monitor.replica[-1]}\n"
+                      f"Ready Replicas: {self.monitor.ready_replica[-1]}\n"
+                      f"Cores:          {self.monitor.cores[-1]}\n"
+                      f"WIP:            {self.monitor.users[-1]}\n"
+                      f"WIP_prom:       {self.monitor.active_users[-1]}\n"
+                      f"WIP_pred:       {self.monitor.predict_users(horizon=self.prediction_horizon)}\n"
+                      f"Util:           {self.monitor.util[-1]}\n"
+                      f"Mem:            {self.monitor.memory[-1]}\n"  # Corretto: memory invece di util
+                      f"Prom latency:   {self.monitor.prom_latency[-1]:.4f}s")
+                bottleneck=self.monitor.bottleneck()
+                if bottleneck is not None:
+                    values=self.monitor.endpoints[bottleneck]
+                    print(f"Slowest step:   {bottleneck[0]} {bottleneck[1]} rt={values['rt']:.3f}s "
+                          f"p95={values.get('p95', float('nan')):.3f}s tr={values.get('tr', float('nan')):.2f}/s")
+                if self.monitor.gen_saturated[-1] > 0:
+                    print(f"[WARNING] Load generator saturated (loop lag {self.monitor.gen_lag[-1]:.3f}s, "
+                          f"CPU {self.monitor.gen_cpu[-1]:.0f}%): measured RT reflects the client")
+            else:
+                print(f"[WARNING] Dati del monitor non ancora disponibili o incompleti nel ciclo {self.ctrlTick}")
+        except Exception as e:
+            print(f"[ERROR] Errore durante il ciclo di controllo: {str(e)}")
+            # Continua l'esecuzione per provare nel prossimo ciclo
+
+    def estimate(self):
+        """
+        Aggiorna la stima ricorsiva O(1) del service time (util = e * tr) con tutti
+        i campioni misurati dall'ultima stima, quindi nessuna misura va persa
+        quando la stima ha una cadenza piu' lenta della misura.
+        """
+        stime=None
+        stimes=None
+        samples, self.samples = self.samples, []
+        for util, tr, service_util in samples:
+            stime=self.estimator.update(util, tr)
+            if self.multi:
+                stimes=self.serviceEstimator.update(service_util, tr)
+        if stime is None:
+            return
+        # la stima viene usata solo dopo la finestra di warm-up
+        if(self.ctrlTick>self.config["estimation_window"] and
+           len(self.monitor.rts)>=self.config["estimation_window"]):
+            self.stime=stime
+            stealth=self.config["stealth"]
+            print(f"Service Time:  {self.stime} stealth={stealth}")
+            if self.multi:
+                self.stimes=stimes
+                print(f"Service Times: {dict(zip(self.services, self.stimes))}")
+
+    def control(self):
+        """
+        Calcola e attua le repliche con l'ultima stima disponibile.
+
+        Returns:
+            numpy.ndarray: Repliche calcolate, None se il controllo non e' stato eseguito
+        """
+        replicas=None
+        if(self.multi and self.stimes is not None and np.all(self.stimes>0)):
+            if(not self.config["stealth"]):
+                replicas=self.controlServices()
+        elif(self.stime is not None and self.stime>0):
+            wip=self.monitor.predict_users(horizon=self.prediction_horizon)
+            if(not self.config["stealth"]):
+                replicas=self.controller.OPTController(e=[self.stime], tgt=[self.targetUtilization()], C=[float(wip)])
+                self.addSuggestion(np.round(replicas))
+                print(f"CTRL:          {np.round(replicas)} (solve time {self.controller.solve_time*1000:.3f} ms)")
+                self.actuate(np.round(replicas))
+        return replicas
+
+    def controlServices(self):
+        """
+        Dimensiona tutti i servizi configurati con una sola chiamata al controllore
+        e attua il risultato su ciascuno.
+
+        Returns:
+            numpy.ndarray: Repliche calcolate per servizio
+        """
+        wip=self.monitor.predict_users(horizon=self.prediction_horizon)
+        bounds=self.services if isinstance(self.services, dict) else {}
+        names=list(self.services)
+        replicas=self.controller.OPTControllerMulti(e=self.stimes,
+                                                    tgt=[self.targetUtilization()]*len(names),
+                                                    C=[float(wip)]*len(names),
+                                                    budget=self.config.get("core_budget"),
+                                                    min_cores=[bounds.get(s, {}).get("min", self.controller.min_cores) for s in names],
+                                                    max_cores=[bounds.get(s, {}).get("max", self.controller.max_cores) for s in names])
+        print(f"CTRL:          {dict(zip(names, np.round(replicas)))} (solve time {self.controller.solve_time*1000:.3f} ms)")
+        for service_name, replica in zip(names, np.round(replicas)):
+            self.addSuggestion(replica, service_name=service_name)
+            self.actuate(replica, service_name=service_name)
+        return replicas
+
+    def targetUtilization(self):
+        """
+        Utilizzazione obiettivo del controllore. Se la configurazione fissa un percentile
+        della SLA (sla_percentile, es. 0.95) e il percentile misurato supera la SLA,
+        l'obiettivo viene ridotto in proporzione: tgt * min(1, sla / p_q).
+
+        Returns:
+            float: Utilizzazione obiettivo effettiva
+        """
+        tgt=self.config["target_utilization"]
+        q=self.config.get("sla_percentile")
+        if q is None:
+            return tgt
+        pq=self.monitor.percentile(q)
+        if pq is None or pq<=0:
+            return tgt
+        effective=tgt*min(1.0, self.monitor.sla/pq)
+        if effective<tgt:
+            print(f"[SLA] p{int(round(q*100))}={pq:.3f}s > SLA {self.monitor.sla}s: target utilization {tgt} -> {effective:.3f}")
+        return effective
+
+    def addSuggestion(self,replica,service_name=None):
+        """
+        Aggiunge un nuovo valore all'array circolare delle suggestioni del servizio.
         Quando l'array raggiunge la dimensione massima (self.cooldown),
         sposta tutti gli elementi a sinistra e aggiunge il nuovo valore alla fine.
 
         Args:
             replica (float): Valore di replica da aggiungere
+            service_name (str, optional): Servizio a cui si riferisce (default config["service_name"])
         """
-        if len(self.suggestion) >= self.cooldown:
+        service_name = service_name or self.config["service_name"]
+        suggestion = self.suggestions.get(service_name, [])
+        if len(suggestion) >= self.cooldown:
             # Shift tutti gli elementi a sinistra (rimuove il primo elemento)
             # e aggiungi il nuovo valore alla fine
-            self.suggestion = self.suggestion[1:] + [replica]
+            self.suggestions[service_name] = suggestion[1:] + [replica]
         else:
             # Aggiungi il valore alla fine dell'array
-            self.suggestion.append(replica)
+            self.suggestions[service_name] = suggestion + [replica]
 
-    def isDownScale(self, requested_replicas):
+    def isDownScale(self, requested_replicas, service_name=None):
         """
         Determina se si tratta di downscaling confrontando le repliche richieste
         con quelle attualmente configurate nel servizio Docker.
 
         Args:
             requested_replicas (int): Numero di repliche richieste dal controllore
+            service_name (str, optional): Servizio da controllare (default config["service_name"])
 
         Returns:
             bool: True se è downscaling (richieste < attuali), False altrimenti
         """
         try:
             # Construct full service name
-            full_service_name = f"{self.config['stack_name']}_{self.config['service_name']}"
+            full_service_name = f"{self.config['stack_name']}_{service_name or self.config['service_name']}"
 
-            # Get the service
-            service = self.docker_client.services.get(full_service_name)
-
-            # Get current number of replicas from Docker service
-            current_replicas = service.attrs['Spec']['Mode'].get('Replicated', {}).get('Replicas', 1)
+            # Get current number of replicas from the swarm state (or the Docker service)
+            if self.swarm is not None:
+                current_replicas = self.swarm.replicas(full_service_name)
+                if current_replicas is None:
+                    raise docker.errors.NotFound(f"Service {full_service_name} not found")
+            else:
+                service = self.client.services.get(full_service_name)
+                current_replicas = service.attrs['Spec']['Mode'].get('Replicated', {}).get('Replicas', 1)
 
             # It's downscaling if requested replicas are less than current replicas
             is_downscaling = requested_replicas < current_replicas
@@ -137,7 +320,12 @@ class ControlLoop():
         '''
             TODO: parse config
         '''
-        return OPTCTRL(init_cores=1, min_cores=0.1, max_cores=16, st=0.8)
+        if self.config.get("persistent", False):
+            # modello costruito una volta e aggiornato ad ogni tick
+            return PersistentOPTCTRL(init_cores=1, min_cores=0.1, max_cores=16, st=0.8,
+                                     solver=self.config.get("solver", "auto"))
+        return OPTCTRL(init_cores=1, min_cores=0.1, max_cores=16, st=0.8,
+                       solver=self.config.get("solver", "auto"))
 
     def getSimTime(self,environment):
          # Ottieni il tempo corrente.
@@ -154,64 +342,111 @@ class ControlLoop():
             TODO: parse config
         '''
         return Monitoring(window=self.config["measurament_period"],
-                        sla=0.2,
+                        sla=self.config.get("sla", 0.2),
                         serviceName=self.config["service_name"],
+                        services=list(self.services),
                         stack_name=self.config["stack_name"],
                         promHost=self.config["prometheus"]["host"],
                         promPort=self.config["prometheus"]["port"],
                         sysfile=self.config["sysfile"],
                           remote=self.config["remote"],
-                          remote_docker_port=self.config["remote_docker_port"],)
+                          remote_docker_port=self.config["remote_docker_port"],
+                          capacity=self.config.get("history_capacity", 21600),
+                          spill_path=self.config.get("spill_path"),
+                          outfile=self.config["outfile"],
+                          flush_every=self.config.get("flush_every", 1),
+                          readiness_ttl=self.config.get("readiness_ttl", 0.5),
+                          swarm=self.swarm)
 
     def getEstimator(self):
         '''
             TODO: parse config
         '''
-        return QNEstimaator()
+        return RLSEstimator(forgetting=self.config.get("forgetting", 0.95))
 
-    def actuate(self,replicas):
+    def actuate(self,replicas,service_name=None):
         """
         Aggiorna la configurazione del service monitorato impostando il numero di repliche.
         Implementa una logica differenziata: ritardo nel downscaling, risposta immediata nell'upscaling.
+
+        Args:
+            replicas (float): Numero di repliche richieste
+            service_name (str, optional): Servizio da scalare (default config["service_name"])
         """
+        service_name = service_name or self.config['service_name']
         try:
             # Construct full service name
-            full_service_name = f"{self.config['stack_name']}_{self.config['service_name']}"
+            full_service_name = f"{self.config['stack_name']}_{service_name}"
             print(f"[DEBUG ACTUATE] Attempting to scale service: '{full_service_name}' to {int(replicas)} replicas")
-            print(f"[DEBUG ACTUATE] Available services: {[service.name for service in self.docker_client.services.list()]}")
 
-            service = self.docker_client.services.get(full_service_name)
+            if self.swarm is not None:
+                service = self.swarm.service(full_service_name)
+                if service is None:
+                    raise docker.errors.NotFound(f"Service {full_service_name} not found")
+            else:
+                service = self.client.services.get(full_service_name)
             print(f"[DEBUG ACTUATE] Found service: {service.name}")
 
-            # Ottieni il numero attuale di repliche
-            current_replicas = service.attrs['Spec']['Mode'].get('Replicated', {}).get('Replicas', 1)
-
             # Verifica se si tratta di downscaling (richiesta repliche < repliche attuali)
-            if self.isDownScale(int(replicas)):
+            suggestion = self.suggestions.get(service_name, [])
+            if self.isDownScale(int(replicas), service_name=service_name):
                 # Per il downscaling, utilizziamo il massimo delle ultime suggestioni
                 # in modo da essere ancora più cauti nella riduzione delle risorse
-                if len(self.suggestion) > 0:
+                if len(suggestion) > 0:
                     # Calcola il massimo delle suggestioni, ma non scendere sotto il valore minimo
-                    max_suggestion = max(self.suggestion)
+                    max_suggestion = max(suggestion)
                     target_replicas = max(1, int(max_suggestion))
                     print(f"[DOWNSCALING] Richiesto: {int(replicas)}, Massimo suggestioni: {max_suggestion}, Target: {target_replicas}")
-                    service.scale(target_replicas)
+                    self.scale(service, target_replicas)
                 else:
                     # Se non abbiamo suggestioni, usiamo il valore richiesto
-                    service.scale(max(1, int(replicas)))
+                    self.scale(service, max(1, int(replicas)))
             else:
                 # Per l'upscaling, rispondiamo immediatamente per garantire prestazioni
                 # Converti replicas in int per evitare errori JSON
-                service.scale(max(1, int(replicas)))
+                self.scale(service, max(1, int(replicas)))
                 print(f"[UPSCALING] Updated service {full_service_name} to {int(replicas)} replicas")
         except docker.errors.NotFound:
             print(f"[ERROR ACTUATE] Service '{full_service_name}' not found")
-            print(f"[ERROR ACTUATE] Make sure both stack_name ('{self.config['stack_name']}') and service_name ('{self.config['service_name']}') are correct")
+            print(f"[ERROR ACTUATE] Make sure both stack_name ('{self.config['stack_name']}') and service_name ('{service_name}') are correct")
         except Exception as e:
             print(f"[ERROR ACTUATE] Error updating service replicas: {str(e)}")
             print(f"[ERROR ACTUATE] Error type: {type(e)}")
-            print(f"[ERROR ACTUATE] Current config: stack_name='{self.config['stack_name']}', service_name='{self.config['service_name']}'")
+            print(f"[ERROR ACTUATE] Current config: stack_name='{self.config['stack_name']}', service_name='{service_name}'")
+
+    def scale(self, service, replicas):
+        if self.swarm is not None:
+            # aggiorna subito anche le repliche desiderate in cache
+            self.swarm.scale(service.name, replicas)
+        else:
+            service.scale(replicas)
+
+    def getSwarm(self):
+        try:
+            return SwarmStateCache(self.client, self.config["stack_name"],
+                                   resync=self.config.get("swarm_resync", 30.0)).start()
+        except Exception as e:
+            print(f"[ERROR] Swarm state cache not available, polling the daemon: {str(e)}")
+            return None
+
+    def getScheduler(self):
+        return (MultiRateScheduler(period=timeparse(self.config["measurament_period"]))
+                .every("measure", 1)
+                .every("estimate", self.config.get("estimation_every", 1))
+                .every("control", self.config["control_widow"]))
+
+    def getRuntime(self):
+        return ControlRuntime(mode=self.config.get("runtime", "thread"))
 
     def saveResults(self):
         self.toStop=True
-        self.monitor.save_to_csv(self.config["outfile"])
+        if self.swarm is not None:
+            self.swarm.close()
+        if self.monitor is None:
+            return
+        if self.runtime is not None:
+            # accodato dopo l'eventuale tick ancora in esecuzione
+            self.runtime.call(self.monitor.save_to_csv, self.config["outfile"])
+            self.runtime.close()
+        else:
+            self.monitor.save_to_csv(self.config["outfile"])
@@ -5,11 +5,15 @@ import os
 
 class OPTCTRL():
     
-    def __init__(self,init_cores, min_cores, max_cores, st=0.8):
+    def __init__(self,init_cores, min_cores, max_cores, st=0.8, solver="auto"):
         self.init_cores=init_cores
         self.min_cores=min_cores
         self.max_cores=max_cores
         self.st=st
+        # "auto": analitico per una sola applicazione, SCIP altrimenti
+        self.solver=solver
+        # tempo impiegato dall'ultima decisione (secondi)
+        self.solve_time=None
     
     def OPTControllerCasadi(self, e, tgt, C):
         """
@@ -61,7 +65,191 @@ class OPTCTRL():
         else:
             return 10**(-3)
     
+    def checkInputs(self, e, tgt, C):
+        """
+        Valida gli input dei controllori.
+
+        Returns:
+            float o None: Valore da restituire al posto della soluzione, None se gli input sono validi
+        """
+        if not isinstance(e, (list, np.ndarray)) or not isinstance(C, (list, np.ndarray)) or not isinstance(tgt, (list, np.ndarray)):
+            print("[ERROR CTRL] Input devono essere liste o array numpy")
+            return self.init_cores
+
+        if len(e) == 0 or len(C) == 0 or len(tgt) == 0:
+            print("[ERROR CTRL] Input lists non possono essere vuote")
+            return self.init_cores
+
+        if np.sum(C) <= 0:
+            return 10**(-3)
+        return None
+
     def OPTController(self, e, tgt, C):
+        """
+        Calcola il numero ottimo di core scegliendo il solver in base a self.solver.
+        Con "auto" il caso single-app usa la soluzione in forma chiusa e SCIP
+        resta solo per i problemi multi-app. Il tempo di risoluzione viene
+        salvato in self.solve_time.
+
+        Args:
+            e (list): Service time attuale
+            tgt (list): Utilizzazione target
+            C (list): Numero di utenti attivi
+
+        Returns:
+            float: Numero ottimo di repliche
+        """
+        st = time.perf_counter()
+        try:
+            if self.solver == "analytic" or (self.solver == "auto" and len(e) == 1):
+                return self.OPTControllerAnalytic(e, tgt, C)
+            if len(e) > 1:
+                return self.OPTControllerMulti(e, tgt, C).tolist()
+            return self.OPTControllerSCIP(e, tgt, C)
+        finally:
+            self.solve_time = time.perf_counter() - st
+
+    def OPTControllerAnalytic(self, e, tgt, C):
+        """
+        Risolve in forma chiusa lo stesso problema di OPTControllerSCIP per una sola applicazione.
+
+        Con T(S) = min(C/(1+e), S/e) l'obiettivo |e*T - tgt*S| - T e' lineare a tratti
+        in S, quindi il minimo su [min_cores, max_cores] cade su un estremo o su un
+        punto di rottura: S = e*C/(1+e) (cambio del min) e S = e*C/((1+e)*tgt)
+        (errore nullo). Basta valutare questi candidati; a parita' di obiettivo si
+        sceglie il numero di core piu' basso.
+
+        Args:
+            e (list): Service time attuale
+            tgt (list): Utilizzazione target
+            C (list): Numero di utenti attivi
+
+        Returns:
+            float: Numero ottimo di repliche
+        """
+        fallback = self.checkInputs(e, tgt, C)
+        if fallback is not None:
+            return fallback
+
+        e_val = float(e[0])
+        if e_val <= 0:
+            print(f"[ERROR CTRL] Service time non valido: {e_val}")
+            return self.init_cores
+        return float(self.analyticCores(e[:1], tgt[:1], C[:1], self.min_cores, self.max_cores)[0])
+
+    @staticmethod
+    def analyticCores(e, tgt, C, lb, ub):
+        """
+        Versione vettoriale della soluzione in forma chiusa: calcola l'ottimo di ogni
+        applicazione indipendentemente (senza vincoli di accoppiamento).
+
+        Args:
+            e, tgt, C (array): Service time, utilizzazione target e utenti per applicazione
+            lb, ub (float o array): Limiti minimo e massimo di core per applicazione
+
+        Returns:
+            numpy.ndarray: Core ottimi per applicazione
+        """
+        e = np.asarray(e, dtype=float)
+        tgt = np.asarray(tgt, dtype=float)
+        C = np.asarray(C, dtype=float)
+        lb = np.broadcast_to(np.asarray(lb, dtype=float), e.shape)
+        ub = np.broadcast_to(np.asarray(ub, dtype=float), e.shape)
+
+        term1 = C/(1.0 + e)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zero_err = np.where(tgt > 0, e*term1/tgt, ub)
+        # candidati (nApp, 4): estremi e punti di rottura
+        S = np.clip(np.stack([lb, ub, e*term1, zero_err], axis=1), lb[:, None], ub[:, None])
+        T = np.minimum(term1[:, None], S/e[:, None])
+        obj = np.abs(e[:, None]*T - tgt[:, None]*S) - T
+        S = np.where(obj <= obj.min(axis=1, keepdims=True) + 1e-9, S, np.inf)
+        return S.min(axis=1)
+
+    def OPTControllerMulti(self, e, tgt, C, budget=None, min_cores=None, max_cores=None):
+        """
+        Dimensiona congiuntamente N servizi con un'unica risoluzione.
+
+        Senza budget (o con budget non attivo) il problema e' separabile e si usa la
+        soluzione in forma chiusa vettoriale; se la somma dei core supera il budget
+        condiviso si risolve un solo MILP SCIP con tutti i servizi.
+
+        Args:
+            e (array): Service time per servizio
+            tgt (array): Utilizzazione target per servizio
+            C (array): Utenti attivi visti da ogni servizio
+            budget (float, optional): Numero massimo di core totali
+            min_cores (float o array, optional): Core minimi per servizio (default self.min_cores)
+            max_cores (float o array, optional): Core massimi per servizio (default self.max_cores)
+
+        Returns:
+            numpy.ndarray: Core ottimi per servizio
+        """
+        st = time.perf_counter()
+        try:
+            e = np.atleast_1d(np.asarray(e, dtype=float))
+            nApp = len(e)
+            tgt = np.broadcast_to(np.asarray(tgt, dtype=float), (nApp,))
+            C = np.broadcast_to(np.asarray(C, dtype=float), (nApp,))
+            lb = np.broadcast_to(np.asarray(self.min_cores if min_cores is None else min_cores, dtype=float), (nApp,))
+            ub = np.broadcast_to(np.asarray(self.max_cores if max_cores is None else max_cores, dtype=float), (nApp,))
+
+            if nApp == 0 or np.any(e <= 0):
+                print(f"[ERROR CTRL] Service time non validi: {e}")
+                return np.full(nApp, float(self.init_cores))
+            if np.sum(C) <= 0:
+                return np.full(nApp, 10**(-3))
+
+            S = self.analyticCores(e, tgt, C, lb, ub)
+            if budget is None or np.sum(S) <= budget + 1e-9:
+                return S
+            if np.sum(lb) > budget:
+                print(f"[ERROR CTRL] Budget {budget} inferiore alla somma dei minimi {np.sum(lb)}")
+                return lb.copy()
+            return self.solveSCIPMulti(e, tgt, C, lb, ub, budget, fallback=S)
+        finally:
+            self.solve_time = time.perf_counter() - st
+
+    def solveSCIPMulti(self, e, tgt, C, lb, ub, budget, fallback):
+        """
+        MILP big-M di OPTControllerSCIP esteso a N servizi con vincolo sul budget di core.
+        """
+        try:
+            from pyscipopt import Model, quicksum
+
+            model = Model("controller_multi")
+            model.hideOutput()
+
+            nApp = len(e)
+            S = [model.addVar(f"S_{i}", lb=lb[i], ub=ub[i]) for i in range(nApp)]
+            T = [model.addVar(f"T_{i}", lb=0) for i in range(nApp)]
+            z = [model.addVar(f"z_{i}", vtype="B") for i in range(nApp)]
+            error = [model.addVar(f"error_{i}", lb=0) for i in range(nApp)]
+
+            for i in range(nApp):
+                term1 = C[i]/(1.0 + e[i])
+                M = max(ub[i]/e[i], C[i]) * 2
+                model.addCons(T[i] <= term1, f"bound1_{i}")
+                model.addCons(T[i] <= S[i]/e[i], f"bound2_{i}")
+                model.addCons(T[i] >= term1 - M*(1-z[i]), f"bound3_{i}")
+                model.addCons(T[i] >= S[i]/e[i] - M*z[i], f"bound4_{i}")
+                model.addCons(error[i] >= e[i]*T[i] - tgt[i]*S[i], f"error_bound1_{i}")
+                model.addCons(error[i] >= -(e[i]*T[i] - tgt[i]*S[i]), f"error_bound2_{i}")
+
+            model.addCons(quicksum(S) <= budget, "budget")
+            model.setObjective(quicksum(error[i] - T[i] for i in range(nApp)), "minimize")
+            model.setRealParam('limits/time', 60)
+            model.optimize()
+
+            if model.getStatus() == "optimal":
+                return np.array([model.getVal(S[i]) for i in range(nApp)])
+            print(f"[ERROR] Multi-service optimization failed: {model.getStatus()}")
+        except Exception as ex:
+            print(f"[ERROR] Exception in multi-service optimization: {str(ex)}")
+        # ridimensiona proporzionalmente la soluzione non vincolata
+        return np.maximum(lb, fallback*budget/np.sum(fallback))
+
+    def OPTControllerSCIP(self, e, tgt, C):
         """
         Implementa il controllore ottimo usando SCIP.
         
@@ -78,16 +266,9 @@ class OPTCTRL():
             import numpy as np
 
             # Validazione input
-            if not isinstance(e, (list, np.ndarray)) or not isinstance(C, (list, np.ndarray)) or not isinstance(tgt, (list, np.ndarray)):
-                print("[ERROR SCIP] Input devono essere liste o array numpy")
-                return self.init_cores
-                
-            if len(e) == 0 or len(C) == 0 or len(tgt) == 0:
-                print("[ERROR SCIP] Input lists non possono essere vuote")
-                return self.init_cores
-
-            if np.sum(C) <= 0:
-                return 10**(-3)
+            fallback = self.checkInputs(e, tgt, C)
+            if fallback is not None:
+                return fallback
 
             # Estrai i valori scalari per il caso single-app
             e_val = float(e[0])
@@ -155,6 +336,202 @@ class OPTCTRL():
     def __str__(self):
         return super().__str__() + " OPTCTRL: %.2f, l: %.2f h: %.2f " % (self.step, self.l, self.h)
     
+class PersistentOPTCTRL(OPTCTRL):
+    """
+    OPTCTRL con modelli persistenti: il MILP SCIP e il problema CasADi vengono
+    costruiti una sola volta (per numero di applicazioni) e ad ogni tick si
+    aggiornano solo i coefficienti che dipendono da e, C e tgt. Entrambi partono
+    dalla soluzione precedente come warm start.
+
+    Con solver "auto" anche il caso single-app usa il modello SCIP persistente
+    (la forma chiusa non ha un modello da mantenere); "analytic" non e' ammesso.
+    """
+
+    def __init__(self, init_cores, min_cores, max_cores, st=0.8, solver="auto"):
+        if solver == "analytic":
+            raise ValueError("The persistent controller needs an optimization model: "
+                             "use solver 'auto' or 'scip' with persistent, or disable persistent")
+        super().__init__(init_cores, min_cores, max_cores, st=st,
+                         solver="scip" if solver == "auto" else solver)
+        self.scip = None
+        self.scip_prev = None
+        self.opti = None
+        self.opti_prev = None
+
+    def buildSCIP(self, nApp):
+        """
+        Costruisce il MILP big-M per nApp applicazioni con coefficienti segnaposto.
+        I vincoli sono scritti in forma lineare (e*T - S <= 0, ...) per poterli
+        aggiornare con chgCoefLinear/chgRhs/chgLhs.
+        """
+        from pyscipopt import Model, quicksum
+
+        model = Model("controller_persistent")
+        model.hideOutput()
+        model.setRealParam('limits/time', 60)
+
+        S = [model.addVar(f"S_{i}", lb=self.min_cores, ub=self.max_cores) for i in range(nApp)]
+        T = [model.addVar(f"T_{i}", lb=0) for i in range(nApp)]
+        z = [model.addVar(f"z_{i}", vtype="B") for i in range(nApp)]
+        error = [model.addVar(f"error_{i}", lb=0) for i in range(nApp)]
+
+        cons = []
+        for i in range(nApp):
+            cons.append({
+                # T <= C/(1+e)
+                "bound1": model.addCons(T[i] <= 1, f"bound1_{i}"),
+                # e*T - S <= 0
+                "bound2": model.addCons(T[i] - S[i] <= 0, f"bound2_{i}"),
+                # T - M*z >= C/(1+e) - M
+                "bound3": model.addCons(T[i] - z[i] >= 0, f"bound3_{i}"),
+                # e*T - S + e*M*z >= 0
+                "bound4": model.addCons(T[i] - S[i] + z[i] >= 0, f"bound4_{i}"),
+                # error - e*T + tgt*S >= 0
+                "error1": model.addCons(error[i] - T[i] + S[i] >= 0, f"error_bound1_{i}"),
+                # error + e*T - tgt*S >= 0
+                "error2": model.addCons(error[i] + T[i] - S[i] >= 0, f"error_bound2_{i}"),
+            })
+        budget = model.addCons(quicksum(S) <= model.infinity(), "budget")
+        model.setObjective(quicksum(error[i] - T[i] for i in range(nApp)), "minimize")
+
+        self.scip = {"model": model, "nApp": nApp, "S": S, "T": T, "z": z,
+                     "error": error, "cons": cons, "budget": budget}
+        self.scip_prev = None
+
+    def updateSCIP(self, e, tgt, C, lb, ub, budget):
+        m = self.scip
+        model = m["model"]
+        for i in range(m["nApp"]):
+            term1 = C[i]/(1.0 + e[i])
+            M = max(ub[i]/e[i], C[i]) * 2
+            c = m["cons"][i]
+            model.chgRhs(c["bound1"], term1)
+            model.chgCoefLinear(c["bound2"], m["T"][i], e[i])
+            model.chgCoefLinear(c["bound3"], m["z"][i], -M)
+            model.chgLhs(c["bound3"], term1 - M)
+            model.chgCoefLinear(c["bound4"], m["T"][i], e[i])
+            model.chgCoefLinear(c["bound4"], m["z"][i], e[i]*M)
+            model.chgCoefLinear(c["error1"], m["T"][i], -e[i])
+            model.chgCoefLinear(c["error1"], m["S"][i], tgt[i])
+            model.chgCoefLinear(c["error2"], m["T"][i], e[i])
+            model.chgCoefLinear(c["error2"], m["S"][i], -tgt[i])
+            model.chgVarLb(m["S"][i], lb[i])
+            model.chgVarUb(m["S"][i], ub[i])
+        model.chgRhs(m["budget"], model.infinity() if budget is None else budget)
+
+    def warmStartSCIP(self, e, tgt, C, lb, ub, budget):
+        """
+        Propone a SCIP la soluzione precedente, resa ammissibile per i nuovi parametri.
+        """
+        if self.scip_prev is None:
+            return
+        S = np.clip(self.scip_prev, lb, ub)
+        if budget is not None and np.sum(S) > budget:
+            return
+        m = self.scip
+        model = m["model"]
+        term1 = C/(1.0 + e)
+        T = np.minimum(term1, S/e)
+        sol = model.createSol()
+        for i in range(m["nApp"]):
+            model.setSolVal(sol, m["S"][i], S[i])
+            model.setSolVal(sol, m["T"][i], T[i])
+            model.setSolVal(sol, m["z"][i], 1.0 if term1[i] <= S[i]/e[i] else 0.0)
+            model.setSolVal(sol, m["error"][i], abs(e[i]*T[i] - tgt[i]*S[i]))
+        model.addSol(sol, free=True)
+
+    def solveSCIPMulti(self, e, tgt, C, lb, ub, budget, fallback):
+        try:
+            nApp = len(e)
+            if self.scip is None or self.scip["nApp"] != nApp:
+                self.buildSCIP(nApp)
+            else:
+                self.scip["model"].freeTransform()
+            self.updateSCIP(e, tgt, C, lb, ub, budget)
+            self.warmStartSCIP(e, tgt, C, lb, ub, budget)
+
+            model = self.scip["model"]
+            model.optimize()
+            if model.getStatus() == "optimal":
+                S = np.array([model.getVal(v) for v in self.scip["S"]])
+                self.scip_prev = S
+                return S
+            print(f"[ERROR] Persistent optimization failed: {model.getStatus()}")
+        except Exception as ex:
+            print(f"[ERROR] Exception in persistent optimization: {str(ex)}")
+            # ricostruisce il modello alla prossima chiamata
+            self.scip = None
+        if budget is None:
+            return fallback
+        return np.maximum(lb, fallback*budget/np.sum(fallback))
+
+    def OPTControllerSCIP(self, e, tgt, C):
+        """
+        Versione persistente di OPTControllerSCIP: riusa il modello multi-app con nApp=1.
+        """
+        fallback = self.checkInputs(e, tgt, C)
+        if fallback is not None:
+            return fallback
+        e_val = float(e[0])
+        if e_val <= 0:
+            print(f"[ERROR CTRL] Service time non valido: {e_val}")
+            return self.init_cores
+        S = self.solveSCIPMulti(np.array([e_val]), np.array([float(tgt[0])]), np.array([float(C[0])]),
+                                np.array([self.min_cores]), np.array([self.max_cores]), None,
+                                fallback=np.array([float(self.init_cores)]))
+        return float(S[0])
+
+    def buildCasadi(self, nApp):
+        # problema di OPTCTRL.OPTControllerCasadi (conico, osqp) con il target come parametro
+        self.opti = casadi.Opti("conic")
+        T = self.opti.variable(1, nApp)
+        S = self.opti.variable(1, nApp)
+        e = self.opti.parameter(1, nApp)
+        tgt = self.opti.parameter(1, nApp)
+        C = self.opti.parameter(1, nApp)
+
+        self.opti.subject_to(T >= 0)
+        self.opti.subject_to(self.opti.bounded(self.min_cores, S, self.max_cores))
+        obj = 0
+        for i in range(nApp):
+            self.opti.subject_to(T[0, i] == casadi.fmin(C[0, i] / (1.0+e[0, i]), S[0, i] / e[0, i]))
+            obj += (e[0, i]*T[0, i]-tgt[0, i]*S[0, i])**2
+        self.opti.minimize(obj)
+        optionsOSQP = {'print_time': False, 'osqp': {'verbose': 0}}
+        self.opti.solver('osqp', optionsOSQP)
+        self.opti_vars = {"nApp": nApp, "T": T, "S": S, "e": e, "tgt": tgt, "C": C}
+        self.opti_prev = None
+
+    def OPTControllerCasadi(self, e, tgt, C):
+        """
+        Versione persistente di OPTControllerCasadi: e, tgt e C sono parametri del
+        problema CasADi costruito una volta. osqp parte dalla soluzione del tick
+        precedente, che e' anche il punto in cui viene linearizzato fmin.
+        """
+        if np.sum(C) <= 0:
+            return 10**(-3)
+        nApp = len(tgt)
+        if self.opti is None or self.opti_vars["nApp"] != nApp:
+            self.buildCasadi(nApp)
+        v = self.opti_vars
+        self.opti.set_value(v["e"], np.reshape(np.asarray(e, dtype=float), (1, nApp)))
+        self.opti.set_value(v["tgt"], np.reshape(np.asarray(tgt, dtype=float), (1, nApp)))
+        self.opti.set_value(v["C"], np.reshape(np.asarray(C, dtype=float), (1, nApp)))
+        if self.opti_prev is not None:
+            self.opti.set_initial(v["S"], self.opti_prev["S"])
+            self.opti.set_initial(v["T"], self.opti_prev["T"])
+        try:
+            sol = self.opti.solve()
+        except Exception as ex:
+            print(f"[ERROR] Persistent CasADi solve failed: {str(ex)}")
+            # riparte dal punto iniziale di default
+            self.opti_prev = None
+            return self.init_cores
+        self.opti_prev = {"S": sol.value(v["S"]), "T": sol.value(v["T"])}
+        if nApp == 1:
+            return sol.value(v["S"])
+        return sol.value(v["S"]).tolist()
+
 if __name__ == '__main__':
     def test_controllers():
         """
@@ -177,9 +554,9 @@ if __name__ == '__main__':
         print(f"Risultato casadi: {s_casadi}")
         
         # Test OPTController
-        print("\nTest OPTController (SCIP):")
+        print("\nTest OPTControllerSCIP:")
         start_time = time.time()
-        s_scip = ctrl.OPTController(e, tgt, C)
+        s_scip = ctrl.OPTControllerSCIP(e, tgt, C)
         scip_time = time.time() - start_time
         print(f"Tempo di esecuzione SCIP: {scip_time:.4f} secondi")
         print(f"Risultato SCIP: {s_scip}")
@@ -193,6 +570,21 @@ if __name__ == '__main__':
         print(f"Differenza assoluta: {diff:.6f}")
         print(f"Speedup: {casadi_time/scip_time:.2f}x")
 
+        # Confronto soluzione analitica vs SCIP su una griglia di casi
+        print("\nTest OPTControllerAnalytic vs SCIP:")
+        ctrl.solver = "analytic"
+        analytic_times = []
+        max_diff = 0.0
+        for e_i in [0.005, 0.038, 0.1, 0.5]:
+            for tgt_i in [0.2, 0.3, 0.5, 0.8]:
+                for C_i in [1, 10, 100, 1000]:
+                    s_an = ctrl.OPTController([e_i], [tgt_i], [C_i])
+                    analytic_times.append(ctrl.solve_time)
+                    s_ref = ctrl.OPTControllerSCIP([e_i], [tgt_i], [C_i])
+                    max_diff = max(max_diff, abs(s_an - s_ref))
+        print(f"Differenza massima: {max_diff:.6f}")
+        print(f"Tempo medio analitico: {np.mean(analytic_times)*1e6:.1f} us")
+
     # Esegui i test
     test_controllers()
     
@@ -0,0 +1,98 @@
+import gevent
+from gevent.threadpool import ThreadPool
+from gevent.queue import Queue, Full, Empty
+
+
+class ControlRuntime():
+    """
+    Esegue il lavoro bloccante del control loop (query Prometheus, docker, solver)
+    fuori dall'hub gevent che genera il carico Locust.
+
+    In modalita' "thread" ogni tick viene eseguito in un thread nativo di un
+    ThreadPool gevent: il greenlet che lo ha sottomesso aspetta in modo cooperativo
+    e gli utenti Locust continuano a girare. I risultati tornano al lato Locust
+    attraverso la coda `outbox`. La modalita' "inline" esegue tutto nel greenlet
+    chiamante (comportamento originale).
+    """
+
+    def __init__(self, mode="thread", maxsize=16):
+        if mode not in ("thread", "inline"):
+            raise ValueError(f"Unknown control runtime mode: {mode}")
+        self.mode = mode
+        self.pool = ThreadPool(1) if mode == "thread" else None
+        self.pending = None
+        self.skipped = 0
+        # coda dei risultati dei tick verso il lato Locust (i piu' vecchi vengono scartati)
+        self.outbox = Queue(maxsize=maxsize)
+
+    @property
+    def busy(self):
+        return self.pending is not None and not self.pending.ready()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Runs fn off the hub and waits cooperatively for its result.
+        """
+        if self.pool is None:
+            return fn(*args, **kwargs)
+        return self.pool.spawn(fn, *args, **kwargs).get()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedules fn off the hub without waiting for it.
+        The result is pushed to self.outbox when fn completes.
+
+        Returns:
+            bool: False if the previous submission is still running and this one was skipped
+        """
+        if self.busy:
+            self.skipped += 1
+            print(f"[WARNING] Control tick still running, skipping this one (skipped={self.skipped})")
+            return False
+        if self.pool is None:
+            self._publish(fn(*args, **kwargs))
+            return True
+        self.pending = self.pool.spawn(fn, *args, **kwargs)
+        self.pending.rawlink(self._on_done)
+        return True
+
+    def _on_done(self, result):
+        try:
+            self._publish(result.get())
+        except Exception as e:
+            print(f"[ERROR] Error in control tick: {str(e)}")
+
+    def _publish(self, item):
+        if item is None:
+            return
+        try:
+            self.outbox.put_nowait(item)
+        except Full:
+            self.outbox.get_nowait()
+            self.outbox.put_nowait(item)
+
+    def drain(self):
+        """
+        Returns all the results published since the last call.
+        """
+        items = []
+        while True:
+            try:
+                items.append(self.outbox.get_nowait())
+            except Empty:
+                return items
+
+    def join(self, timeout=None):
+        """
+        Waits cooperatively for the running submission, if any.
+        """
+        if self.pending is not None:
+            gevent.wait([self.pending], timeout=timeout)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.kill()
+            self.pool = None
+
+    def __str__(self):
+        return f"ControlRuntime(mode={self.mode}, skipped={self.skipped})"
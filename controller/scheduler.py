@@ -0,0 +1,113 @@
+import math
+import time
+from prometheus_client import Counter, Gauge
+
+SCHEDULER_JITTER = Gauge('soy_control_tick_jitter_seconds',
+                         'Delay of the control tick wake-up over its deadline', ['stat'])
+SCHEDULER_SKIPPED = Counter('soy_control_ticks_skipped_total',
+                            'Control ticks skipped because of an overrun', ['reason'])
+SCHEDULER_TICKS = Counter('soy_control_ticks_total', 'Control ticks executed', ['task'])
+
+
+class MultiRateScheduler():
+    """
+    Scheduler a scadenze fisse per il control loop.
+
+    Le scadenze sono calcolate dall'istante di avvio (start + k*period) e non
+    dalla fine del lavoro del tick precedente, quindi il periodo reale non deriva
+    con la durata di misura, stima e controllo. Ogni attivita' ha la propria
+    cadenza in multipli del periodo base (es. misura ogni tick, stima ogni n,
+    controllo ogni m): un tick esegue le attivita' per cui k % every == 0.
+
+    Se il risveglio arriva dopo la scadenza successiva (overrun) i tick persi
+    vengono saltati esplicitamente e contati, invece di essere recuperati in
+    sequenza. Il ritardo del risveglio rispetto alla scadenza (jitter) viene
+    esportato su Prometheus insieme ai tick saltati.
+    """
+
+    def __init__(self, period, clock=time.monotonic, sleep=time.sleep):
+        if period <= 0:
+            raise ValueError(f"Scheduler period must be positive, got {period}")
+        self.period = float(period)
+        self.clock = clock
+        self.sleep = sleep
+        # nome attivita' -> cadenza in tick
+        self.cadences = {}
+        self.start = None
+        self.tick = -1
+        self.skipped = {"late": 0, "busy": 0}
+        self.jitter = {"last": 0.0, "mean": 0.0, "max": 0.0}
+        self.samples = 0
+
+    def every(self, name, ticks):
+        """
+        Registers an activity run every `ticks` base periods.
+        """
+        ticks = int(ticks)
+        if ticks < 1:
+            raise ValueError(f"Cadence of '{name}' must be at least one tick, got {ticks}")
+        self.cadences[name] = ticks
+        return self
+
+    def deadline(self, tick):
+        return self.start + tick*self.period
+
+    def due(self, tick):
+        """
+        Returns the activities scheduled at the given tick.
+        """
+        return {name for name, ticks in self.cadences.items() if tick % ticks == 0}
+
+    def wait(self):
+        """
+        Sleeps until the next deadline and returns the tick to run.
+        Ticks whose deadline has already been passed by a full period are skipped.
+
+        Returns:
+            tuple: (tick, set of activities due at that tick)
+        """
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+        tick = self.tick + 1
+        lateness = now - self.deadline(tick)
+        if lateness >= self.period:
+            # overrun: si salta direttamente all'ultima scadenza gia' passata
+            missed = int(math.floor(lateness/self.period))
+            self.skip("late", missed)
+            tick += missed
+        delay = self.deadline(tick) - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        self.record(self.clock() - self.deadline(tick))
+        self.tick = tick
+        return tick, self.due(tick)
+
+    def executed(self, due):
+        """
+        Records the activities of a tick that was actually started
+        (call it only once the tick has been accepted, see skip for the others).
+        """
+        for name in due:
+            SCHEDULER_TICKS.labels(task=name).inc()
+
+    def skip(self, reason, ticks=1):
+        """
+        Records ticks that were not executed (late wake-up or previous tick still running).
+        """
+        self.skipped[reason] = self.skipped.get(reason, 0) + ticks
+        SCHEDULER_SKIPPED.labels(reason=reason).inc(ticks)
+        print(f"[WARNING] Control loop overrun ({reason}): skipped {ticks} tick(s), total {sum(self.skipped.values())}")
+
+    def record(self, lateness):
+        lateness = max(0.0, lateness)
+        self.samples += 1
+        self.jitter["last"] = lateness
+        self.jitter["mean"] += (lateness - self.jitter["mean"])/self.samples
+        self.jitter["max"] = max(self.jitter["max"], lateness)
+        for stat, value in self.jitter.items():
+            SCHEDULER_JITTER.labels(stat=stat).set(value)
+
+    def __str__(self):
+        return (f"MultiRateScheduler(period={self.period}, cadences={self.cadences}, tick={self.tick}, "
+                f"skipped={self.skipped}, jitter_mean={self.jitter['mean']:.4f}, jitter_max={self.jitter['max']:.4f})")
@@ -1,2 +1,8 @@
 from estimator.monitoring import Monitoring
-from estimator.qnestimator import QNEstimaator
\ No newline at end of file
+from estimator.qnestimator import QNEstimaator
+from estimator.promsampler import PromSampler
+from estimator.rlsestimator import RLSEstimator
+from estimator.timeseries import RingBuffer, TimeSeriesStore
+from estimator.streamwriter import StreamWriter, follow
+from estimator.swarmstate import SwarmStateCache
+from estimator.endpoints import time_shares, bottleneck
\ No newline at end of file
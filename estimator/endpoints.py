@@ -0,0 +1,36 @@
+import math
+
+
+def time_shares(endpoints):
+    """
+    Frazione del tempo di risposta totale spesa in ciascun endpoint: rt * tr
+    (secondi di risposta al secondo) normalizzato sulla somma degli endpoint.
+    E' la definizione di collo di bottiglia usata sia da Monitoring (online)
+    sia da scripts/rac_calculator.py (offline).
+
+    Args:
+        endpoints (dict): Chiave dell'endpoint (es. (method, name)) -> {"rt": s, "tr": req/s}
+
+    Returns:
+        dict: Chiave -> quota in [0, 1]; vuoto se nessun endpoint ha rt e tr validi
+    """
+    busy = {}
+    for key, values in endpoints.items():
+        rt, tr = values.get("rt"), values.get("tr")
+        if rt is None or tr is None or not (math.isfinite(rt) and math.isfinite(tr)):
+            continue
+        busy[key] = rt*tr
+    total = sum(busy.values())
+    if total <= 0:
+        return {}
+    return {key: value/total for key, value in busy.items()}
+
+
+def bottleneck(endpoints):
+    """
+    Returns the key of the endpoint with the largest share of response time, or None.
+    """
+    shares = time_shares(endpoints)
+    if not shares:
+        return None
+    return max(shares, key=shares.get)
@@ -11,14 +11,36 @@ import requests
 import re
 import json
 import time
-# Get service info using Docker CLI
-import subprocess
+from collections import deque
+from estimator.promsampler import PromSampler
+from estimator.timeseries import RingBuffer, TimeSeriesStore
+from estimator.streamwriter import StreamWriter
+from estimator.endpoints import bottleneck
 
 
 class Monitoring:
+    # serie temporali registrate ad ogni tick
+    # percentili della latenza registrati ad ogni tick (colonne rt_p50, rt_p95, rt_p99)
+    QUANTILES = (0.5, 0.95, 0.99)
+    COLUMNS = ["time", "rts", "rt_p50", "rt_p95", "rt_p99", "tr", "cores", "replica", "ready_replica", "users",
+               "active_users", "util", "memory", "prom_latency", "gen_lag", "gen_cpu", "gen_saturated"]
+    # colonne del file di risultati -> serie di origine
+    CSV_COLUMNS = {"cores": "cores", "rts": "rts", "rt_p50": "rt_p50", "rt_p95": "rt_p95", "rt_p99": "rt_p99",
+                   "tr": "tr", "users": "active_users",
+                   "replica": "replica", "ready_replica": "ready_replica", "util": "util",
+                   "mem": "memory", "prom_latency": "prom_latency", "gen_lag": "gen_lag",
+                   "gen_cpu": "gen_cpu", "gen_saturated": "gen_saturated"}
+    # colonne del CSV con valori interi (lo store le tiene come float64)
+    INTEGER_COLUMNS = ["replica", "ready_replica"]
+
+    # colonne del file per endpoint (<outfile>_endpoints.csv), una riga per endpoint e tick
+    ENDPOINT_COLUMNS = ["time", "method", "name", "rt", "p95", "tr", "failures"]
+
     def __init__(self, window, sla, reducer=lambda x: sum(x) / len(x),
                  serviceName="", stack_name="", promHost="localhost",
-                 promPort=9090, sysfile="", has_health_check=False, remote=None, remote_docker_port=None):
+                 promPort=9090, sysfile="", has_health_check=False, remote=None, remote_docker_port=None,
+                 sampling_mode="combined", services=None, capacity=21600, spill_path=None,
+                 outfile=None, flush_every=1, readiness_ttl=0.5, swarm=None):
         self.reducer = reducer
         self.window = window
         self.sla = sla
@@ -32,24 +54,189 @@ class Monitoring:
         else:
             self.client = docker.from_env()
         self.has_health_check = has_health_check
+        # cache delle repliche pronte: servizio -> (istante, valore)
+        self.readiness_ttl = readiness_ttl
+        self.readiness_cache = {}
+        # stato dello stack aggiornato dagli eventi docker (SwarmStateCache); None: interroga il daemon
+        self.swarm = swarm
         if (not Path(self.sysfile).exists()):
             raise FileNotFoundError(f"File {self.sysfile} not found")
         self.sys = yaml.safe_load(self.sysfile.open())
         self.prom = PrometheusConnect(url=f"http://{self.promHost}:{self.promPort}", disable_ssl=True)
+        self.sampler = PromSampler(url=f"http://{self.promHost}:{self.promPort}", mode=sampling_mode)
         self.remote = remote
+        # numero massimo di tick tenuti in memoria; la storia completa va su spill_path
+        self.capacity = capacity
+        self.spill_path = spill_path
+        # risultati scritti in streaming ad ogni tick (None: solo save_to_csv a fine test)
+        self.writer = None
+        self.endpoint_writer = None
+        if outfile is not None:
+            self.writer = StreamWriter(outfile, self.CSV_COLUMNS.keys(), flush_every=flush_every,
+                                       integer_columns=self.INTEGER_COLUMNS)
+            self.endpoint_writer = StreamWriter(self.endpoints_path(outfile), self.ENDPOINT_COLUMNS,
+                                                flush_every=flush_every)
+        # servizi dello stack monitorati (il primo e' sempre serviceName)
+        self.services = [serviceName] + [s for s in (services or []) if s != serviceName]
+        # Tutte le metriche Prometheus di un tick, valutate insieme da self.sampler
+        self.queries = {
+            "rt_sum": "sum(rate(locust_request_latency_seconds_sum[1m]))",
+            "rt_count": "sum(rate(locust_request_latency_seconds_count[1m]))",
+            "tr": "sum(rate(locust_requests_total[30s]))",
+            # somma sui processi Locust (master e worker espongono ciascuno le proprie metriche)
+            "active_users": "sum(locust_active_users)",
+            "util": self.cpu_query(self.stack_name, self.serviceName),
+            # salute del generatore di carico (peggiore tra i processi Locust)
+            "gen_lag": "max(locust_generator_loop_lag_seconds)",
+            "gen_cpu": "max(locust_generator_cpu_percent)",
+            "gen_saturated": "max(locust_generator_saturated)",
+        }
+        # tempi di risposta e throughput per endpoint, raggruppati per metodo e nome della richiesta
+        self.queries.update({
+            "endpoint_rt": ("sum by (method, name) (rate(locust_request_name_latency_seconds_sum[1m])) / "
+                            "sum by (method, name) (rate(locust_request_name_latency_seconds_count[1m]))"),
+            "endpoint_p95": ("histogram_quantile(0.95, sum by (le, method, name) "
+                             "(rate(locust_request_name_latency_seconds_bucket[1m])))"),
+            "endpoint_tr": "sum by (method, name) (rate(locust_request_name_total[30s]))",
+            "endpoint_fail": 'sum by (method, name) (rate(locust_request_name_total{result="failure"}[30s]))',
+        })
+        for q in self.QUANTILES:
+            self.queries[self.quantile_column(q)] = (
+                f"histogram_quantile({q}, sum by (le) (rate(locust_request_latency_seconds_bucket[1m])))")
+        if len(self.services) > 1:
+            # una sola query raggruppata per tutti i servizi, demultiplexata per label
+            pattern = "|".join(re.escape(f"{self.stack_name}_{s}") for s in self.services)
+            self.queries["service_util"] = (
+                f'sum by (container_label_com_docker_swarm_service_name) '
+                f'(rate(container_cpu_usage_seconds_total{{container_label_com_docker_swarm_service_name=~"{pattern}"}}[30s]))')
         self.reset()
 
     def tick(self, t):
-        self.time += [t]
-        self.rts += [self.getResponseTime()]
-        self.tr += [self.getTroughput()]
-        self.cores += [self.getCores()]
-        self.replica += [self.get_replicas(self.stack_name, self.serviceName)]
-        self.ready_replica += [self.get_ready_replicas(self.stack_name, self.serviceName)]
-        self.users += [self.getUsers()]
-        self.active_users += [self.get_active_users()]
-        self.memory += [0]
-        self.util += [self.get_service_cpu_utilization(stack_name=self.stack_name, service_name=self.serviceName)]
+        samples = self.sample()
+        rts = self.getResponseTime(samples)
+        tr = self.getTroughput(samples)
+        self.store.append(time=t,
+                          rts=rts,
+                          rt_p50=self.sample_value(samples, "rt_p50"),
+                          rt_p95=self.sample_value(samples, "rt_p95"),
+                          rt_p99=self.sample_value(samples, "rt_p99"),
+                          tr=tr,
+                          cores=self.getCores(),
+                          replica=self.get_replicas(self.stack_name, self.serviceName),
+                          ready_replica=self.get_ready_replicas(self.stack_name, self.serviceName),
+                          # utenti attivi (Little's Law)
+                          users=rts * tr,
+                          active_users=self.get_active_users(samples),
+                          memory=0,
+                          util=self.get_service_cpu_utilization(stack_name=self.stack_name,
+                                                                service_name=self.serviceName,
+                                                                samples=samples),
+                          prom_latency=self.sampler.latency.get("__tick__", 0.0),
+                          gen_lag=self.sample_value(samples, "gen_lag"),
+                          gen_cpu=self.sample_value(samples, "gen_cpu"),
+                          gen_saturated=self.sample_value(samples, "gen_saturated"))
+        if self.writer is not None:
+            self.writer.write({name: self.store[column][-1] for name, column in self.CSV_COLUMNS.items()})
+        if len(self.services) > 1:
+            self.tick_services(samples)
+        self.tick_endpoints(t, samples)
+
+    def tick_endpoints(self, t, samples):
+        """
+        Records response time, p95, throughput and failure rate of every endpoint.
+        The latest values are kept in self.endpoints, keyed by (method, name).
+        """
+        endpoints = {}
+        for field, query in (("rt", "endpoint_rt"), ("p95", "endpoint_p95"),
+                             ("tr", "endpoint_tr"), ("failures", "endpoint_fail")):
+            for labels, value in samples.get(query, []):
+                key = (labels.get("method", ""), labels.get("name", ""))
+                endpoints.setdefault(key, {})[field] = value
+        self.endpoints = endpoints
+        rows = [{"time": t, "method": method, "name": name, **values}
+                for (method, name), values in sorted(endpoints.items())]
+        if self.endpoint_writer is not None:
+            # un flush per tick (ogni flush_every tick), come il file principale
+            self.endpoint_writer.write_batch(rows)
+        else:
+            self.endpoint_rows.extend(rows)
+
+    def bottleneck(self):
+        """
+        Returns the (method, name) of the endpoint with the largest share of response
+        time (rt * tr) in the last tick, or None (see estimator.endpoints.time_shares).
+        """
+        return bottleneck(self.endpoints)
+
+    @staticmethod
+    def endpoints_path(path):
+        path = Path(path)
+        return path.with_name(f"{path.stem}_endpoints.csv")
+
+    def tick_services(self, samples):
+        """
+        Records utilization and replicas of every monitored service.
+        The main service reuses the values already collected by tick().
+        """
+        util_by_service = {labels.get("container_label_com_docker_swarm_service_name"): value
+                           for labels, value in samples.get("service_util", [])}
+        for service in self.services:
+            if service == self.serviceName:
+                util = self.util[-1]
+                replica = self.replica[-1]
+            else:
+                util = util_by_service.get(f"{self.stack_name}_{service}", 0.0)
+                replica = self.get_replicas(self.stack_name, service)
+            self.service_util[service].append(util)
+            self.service_replica[service].append(replica)
+
+    def sample(self, names=None):
+        """
+        Evaluates the registered Prometheus queries in a single round trip.
+
+        Args:
+            names (list, optional): Subset of self.queries to evaluate. If None, evaluates all of them
+
+        Returns:
+            dict: Mapping query name -> list of (labels, value)
+        """
+        queries = self.queries if names is None else {name: self.queries[name] for name in names}
+        try:
+            return self.sampler.sample(queries)
+        except Exception as e:
+            print(f"[ERROR PROM] Error sampling Prometheus: {str(e)}")
+            return {}
+
+    @staticmethod
+    def sample_value(samples, name, default=None):
+        """
+        Returns the value of the first series of a sampled query, or default if it returned nothing.
+        """
+        series = samples.get(name)
+        if not series:
+            return default
+        return series[0][1]
+
+    @staticmethod
+    def quantile_column(q):
+        return f"rt_p{int(round(q*100))}"
+
+    def percentile(self, q):
+        """
+        Returns the last measured q-quantile of the response time, or None if not available.
+
+        Args:
+            q (float): One of Monitoring.QUANTILES
+        """
+        series = self.store[self.quantile_column(q)]
+        if len(series) == 0 or not np.isfinite(series[-1]):
+            return None
+        return float(series[-1])
+
+    @staticmethod
+    def cpu_query(stack_name, service_name):
+        full_service_name = f"{stack_name}_{service_name}"
+        return f'sum(rate(container_cpu_usage_seconds_total{{container_label_com_docker_swarm_service_name="{full_service_name}"}}[30s]))'
 
     def getUsers(self):
         # torno il numero di utenti attivi (Little's Law)
@@ -73,16 +260,19 @@ class Monitoring:
         result = self.prom.custom_query(query=metric_name)
         return result
 
-    def getResponseTime(self):
+    def getResponseTime(self, samples=None):
         """
         Calcola il tempo di risposta medio degli ultimi 60 secondi utilizzando query Prometheus rate.
+
+        Args:
+            samples (dict, optional): Samples already collected by self.sample() in the current tick
         """
         try:
-            sum_result = self.prom.custom_query(query="sum(rate(locust_request_latency_seconds_sum[1m]))")
-            count_result = self.prom.custom_query(query="sum(rate(locust_request_latency_seconds_count[1m]))")
-            if sum_result and count_result:
-                latency_sum = float(sum_result[0]['value'][1])
-                latency_count = float(count_result[0]['value'][1])
+            if samples is None:
+                samples = self.sample(["rt_sum", "rt_count"])
+            latency_sum = self.sample_value(samples, "rt_sum")
+            latency_count = self.sample_value(samples, "rt_count")
+            if latency_sum is not None and latency_count is not None:
                 avg_latency = latency_sum / latency_count if latency_count > 0 else 0
                 return avg_latency
             else:
@@ -91,15 +281,12 @@ class Monitoring:
             print("Error querying Prometheus for RT:", e)
             return 0
 
-    def getTroughput(self):
+    def getTroughput(self, samples=None):
         # Modifica: utilizzare la query per il rate negli ultimi 1 minuto
         try:
-            result = self.prom.custom_query(query="sum(rate(locust_requests_total[30s]))")
-            if result and len(result) > 0 and 'value' in result[0]:
-                throughput = float(result[0]['value'][1])
-            else:
-                throughput = 0
-            return throughput
+            if samples is None:
+                samples = self.sample(["tr"])
+            return self.sample_value(samples, "tr", 0)
         except Exception as e:
             print("Error querying throughput from Prometheus:", e)
             return 0
@@ -114,6 +301,8 @@ class Monitoring:
         try:
             # Construct the full service name using stack_name and service_name
             full_service_name = f"{stack_name}_{service_name}"
+            if self.swarm is not None:
+                return self.swarm.replicas(full_service_name)
             # print(f"[DEBUG] Attempting to get replicas for service: '{full_service_name}'")
             # print(f"[DEBUG] Available services: {[service.name for service in self.client.services.list()]}")
 
@@ -137,6 +326,11 @@ class Monitoring:
         Gets the number of replicas for a service that are actually ready to process requests.
         This means containers that are in running state and have passed health checks (if configured).
 
+        The probe costs at most two docker API calls regardless of the replica count:
+        one for all the tasks of the service and, with health checks, one for all its
+        healthy containers. Results are cached for self.readiness_ttl seconds so that
+        readers within the same tick share one probe.
+
         Args:
             stack_name (str): The name of the stack
             service_name (str): The name of the service without stack prefix
@@ -144,105 +338,32 @@ class Monitoring:
         Returns:
             int: Number of ready replicas
         """
-        try:
-            # Construct the full service name
-            full_service_name = f"{stack_name}_{service_name}"
-
-            # Get all tasks for this service with their status
-            # cmd = ["docker", "service", "ps", "--format", "{{.CurrentState}}", full_service_name]
-            cmd = []
-            if self.remote is not None:
-                cmd.append("ssh")
-                cmd.append(self.remote)
-            cmd.append("docker")
-            cmd.append("service")
-            cmd.append("ps")
-            cmd.append("--format")
-            cmd.append("{{.CurrentState}}")
-            cmd.append(full_service_name)
-
-            output = subprocess.check_output(cmd, universal_newlines=True)
-
-            # Count only "Running" tasks
-            task_states = output.strip().split('\n')
-            # Filter lines that start with "Running" and are not empty
-            ready_count = sum(1 for state in task_states if state and state.startswith("Running"))
+        # Construct the full service name
+        full_service_name = f"{stack_name}_{service_name}"
+        if self.swarm is not None:
+            return self.swarm.ready(full_service_name, health_check=self.has_health_check)
+        now = time.monotonic()
+        cached = self.readiness_cache.get(full_service_name)
+        if cached is not None and now - cached[0] < self.readiness_ttl:
+            return cached[1]
 
-            # print(f"[DEBUG] Service {full_service_name}: found {ready_count} running replicas")
+        try:
+            # Tutti i task del servizio con una sola chiamata; contano solo quelli in esecuzione
+            tasks = self.client.api.tasks(filters={"service": full_service_name, "desired-state": "running"})
+            running = {task["ID"] for task in tasks if task.get("Status", {}).get("State") == "running"}
+            ready_count = len(running)
 
             # If the service has health checks, we need to count only healthy containers
             if self.has_health_check:
-                try:
-                    # Get task IDs for the service tasks
-                    # cmd = ["docker", "service", "ps", "--format", "{{.ID}}", full_service_name]
-                    cmd = []
-                    if self.remote is not None:
-                        cmd.append("ssh")
-                        cmd.append(self.remote)
-                    cmd.append("docker")
-                    cmd.append("service")
-                    cmd.append("ps")
-                    cmd.append("--format")
-                    cmd.append("{{.ID}}")
-                    cmd.append(full_service_name)
-
-                    task_ids = subprocess.check_output(cmd, universal_newlines=True).strip().split('\n')
-
-                    # Get container IDs from task IDs
-                    container_ids = []
-                    for task_id in task_ids:
-                        if not task_id:
-                            continue
-                        # Get container ID for the task
-                        #                        cmd = ["docker", "inspect", "--format", "{{.Status.ContainerStatus.ContainerID}}", task_id]
-                        cmd = []
-                        if self.remote is not None:
-                            cmd.append("ssh")
-                            cmd.append(self.remote)
-                        cmd.append("docker")
-                        cmd.append("inspect")
-                        cmd.append("--format")
-                        cmd.append("{{.Status.ContainerStatus.ContainerID}}")
-                        cmd.append(task_id)
-
-                        try:
-                            container_id = subprocess.check_output(cmd, universal_newlines=True).strip()
-                            if container_id:
-                                container_ids.append(container_id)
-                        except:
-                            pass
-
-                    healthy_count = 0
-                    for container_id in container_ids:
-                        # Get container health status
-                        #                        cmd = ["docker", "inspect", "--format", "{{if .State.Health}}{{.State.Health.Status}}{{else}}{{.State.Status}}{{end}}", container_id]
-                        cmd = []
-                        if self.remote is not None:
-                            cmd.append("ssh")
-                            cmd.append(self.remote)
-                        cmd.append("docker")
-                        cmd.append("inspect")
-                        cmd.append("--format")
-                        cmd.append("{{if .State.Health}}{{.State.Health.Status}}{{else}}{{.State.Status}}{{end}}")
-                        cmd.append(container_id)
-
-                        try:
-                            health_status = subprocess.check_output(cmd, universal_newlines=True).strip()
-                            # print(f"[DEBUG] Container {container_id[:12]}: Health status = {health_status}")
-                            if health_status == "healthy":
-                                healthy_count += 1
-                        except Exception as e:
-                            print(f"[DEBUG] Error checking health for container {container_id[:12]}: {str(e)}")
-
-                    # print(f"[DEBUG] Service {full_service_name}: found {healthy_count} healthy containers out of {len(container_ids)} containers")
-                    return healthy_count
-                except Exception as e:
-                    print(f"[DEBUG] Error checking container health: {str(e)}")
-                    # Fall back to running count
-                    return ready_count
-            else:
-                # If no health checks, return the number of running containers
-                return ready_count
+                # Una sola chiamata per tutti i container sani del servizio (sul nodo interrogato)
+                containers = self.client.api.containers(filters={
+                    "label": f"com.docker.swarm.service.name={full_service_name}",
+                    "health": "healthy"})
+                ready_count = sum(1 for container in containers
+                                  if (container.get("Labels") or {}).get("com.docker.swarm.task.id") in running)
+
+            self.readiness_cache[full_service_name] = (now, ready_count)
+            return ready_count
 
         except Exception as e:
             print(f"[ERROR] Error in get_ready_replicas: {str(e)}")
@@ -250,87 +371,87 @@ class Monitoring:
             return self.get_replicas(stack_name, service_name)
 
     def reset(self):
-        self.cores = []
-        self.rts = []
-        self.tr = []
-        self.users = []
-        self.time = []
-        self.replica = []
-        self.ready_replica = []  # Aggiungo la lista per le repliche pronte
-        self.util = []
-        self.memory = []
+        # Ogni serie e' un RingBuffer a memoria fissa (self.time, self.rts, self.tr, ...)
+        self.store = TimeSeriesStore(self.COLUMNS, capacity=self.capacity, spill_path=self.spill_path)
+        for column in self.COLUMNS:
+            setattr(self, column, self.store[column])
+        # ultimi valori per endpoint e righe per endpoint (se non scritte in streaming)
+        self.endpoints = {}
+        self.endpoint_rows = deque(maxlen=self.capacity*16)
         # Aggiunta per il throughput
         self.last_requests = None
         self.last_timestamp = None
-        # numero di utenti attivi cosi come visti da locust
-        self.active_users = []
+        # utilizzazione e repliche per servizio (solo con piu' servizi monitorati)
+        self.service_util = {}
+        self.service_replica = {}
+        if len(self.services) > 1:
+            self.service_util = {service: RingBuffer(self.capacity) for service in self.services}
+            self.service_replica = {service: RingBuffer(self.capacity) for service in self.services}
+
+    def generator_saturated(self):
+        """
+        Returns the number of retained ticks in which the load generator reported saturation.
+        """
+        return int(np.nansum(self.gen_saturated.window() > 0))
 
     def save_to_csv(self, filename):
         path = Path(filename)
         path.parent.mkdir(parents=True, exist_ok=True)
+        saturated = self.generator_saturated()
+        if saturated > 0:
+            print(f"[WARNING] Load generator saturated in {saturated} ticks: response times of this run are not reliable")
 
-        # Verifico la lunghezza di tutti gli array
-        lengths = {
-            "cores": len(self.cores),
-            "rts": len(self.rts),
-            "tr": len(self.tr),
-            "users": len(self.active_users),
-            "replica": len(self.replica),
-            "ready_replica": len(self.ready_replica),
-            "util": len(self.util),
-            "mem": len(self.memory)
-        }
+        # Con la scrittura in streaming il file contiene gia' tutti i tick: basta chiuderlo
+        if self.writer is not None and Path(self.writer.path).resolve() == path.resolve():
+            self.writer.close()
+            self.endpoint_writer.close()
+            print(f"Data streamed to {filename} ({self.writer.rows} rows)")
+            return
+
+        # Storia completa: dal file di spill se attivo, altrimenti dagli ultimi self.capacity tick
+        history = self.store.history()
 
         print("###saving results##")
-        print(f"Array lengths: {lengths}")
-
-        # Trovo la lunghezza minima comune tra tutti gli array
-        min_length = min(lengths.values())
-
-        # Creo un dizionario di dati troncando ogni array alla lunghezza minima comune
-        data = {
-            "cores": self.cores[:min_length],
-            "rts": self.rts[:min_length],
-            "tr": self.tr[:min_length],
-            "users": self.active_users[:min_length],
-            "replica": self.replica[:min_length],
-            "ready_replica": self.ready_replica[:min_length],
-            "util": self.util[:min_length],
-            "mem": self.memory[:min_length]
-        }
+        print(f"Rows: {len(history['time'])} (in memory: {len(self.store)})")
+
+        data = {name: history[column] for name, column in self.CSV_COLUMNS.items()}
 
         try:
             df = pd.DataFrame(data)
+            for column in self.INTEGER_COLUMNS:
+                df[column] = df[column].round().astype("Int64")
             df.to_csv(filename, index=False)
-            print(f"Data saved to {filename} (truncated to {min_length} rows)")
+            print(f"Data saved to {filename} ({len(df)} rows)")
+            pd.DataFrame(list(self.endpoint_rows), columns=self.ENDPOINT_COLUMNS).to_csv(
+                self.endpoints_path(filename), index=False)
         except Exception as e:
             print(f"Error saving data: {e}")
-            print(f"Array lengths: cores={len(self.cores)}, rts={len(self.rts)}, "
-                  f"tr={len(self.tr)}, users={len(self.active_users)}, replica={len(self.replica)}, "
-                  f"ready_replica={len(self.ready_replica)}, util={len(self.util)}, mem={len(self.memory)}")
 
-    def get_active_users(self):
+    def get_active_users(self, samples=None):
         """
         Recupera il valore attuale del Gauge 'locust_active_users' tramite una query a Prometheus.
         Assicurati che il job che espone questo metric sia correttamente configurato in Prometheus.
+
+        Args:
+            samples (dict, optional): Samples already collected by self.sample() in the current tick
         """
         try:
-            query = 'locust_active_users'
-            result = self.prom.custom_query(query=query)
-            if result and 'value' in result[0]:
-                return float(result[0]['value'][1])
-            return None
+            if samples is None:
+                samples = self.sample(["active_users"])
+            return self.sample_value(samples, "active_users")
         except Exception as e:
             print("Error fetching active users metric from Prometheus:", e)
             return None
 
-    def get_service_cpu_utilization(self, service_name=None, stack_name=None):
+    def get_service_cpu_utilization(self, service_name=None, stack_name=None, samples=None):
         """
         Gets the total CPU utilization for all replicas of a specific service in a stack using cAdvisor metrics.
 
         Args:
             service_name (str): The name of the service (e.g., 'node')
             stack_name (str, optional): The name of the Docker Swarm stack. If None, uses self.stack_name
+            samples (dict, optional): Samples already collected by self.sample() in the current tick.
+                Only used when service_name and stack_name match the monitored service
 
         Returns:
             float: The total CPU utilization as an absolute value (CPU seconds per second)
@@ -347,24 +468,18 @@ class Monitoring:
             # print(f"[DEBUG CPU] Constructed full service name: '{full_service_name}'")
 
             # Query for CPU usage rate over 1 minute window, summed across all replicas
-
-            query = f'sum(rate(container_cpu_usage_seconds_total{{container_label_com_docker_swarm_service_name="{full_service_name}"}}[30s]))'
-            # print(f"[DEBUG CPU] Prometheus query: {query}")
-
-            result = self.prom.custom_query(query=query)
-            # print(f"[DEBUG CPU] Raw Prometheus result: {result}")
-
-            if result and len(result) > 0:
-                print(f"[DEBUG CPU] Result has data: {result[0]}")
-                if 'value' in result[0]:
-                    total_cpu = float(result[0]['value'][1])
-                    # print(f"[DEBUG CPU] Extracted CPU value: {total_cpu}")
-                    return total_cpu
-                else:
-                    print("[DEBUG CPU] No 'value' key in result[0]")
-            else:
+            if samples is None or full_service_name != f"{self.stack_name}_{self.serviceName}":
+                query = self.cpu_query(stack, service_name)
+                # print(f"[DEBUG CPU] Prometheus query: {query}")
+                samples = {"util": [(dict(series["metric"]), float(series["value"][1]))
+                                    for series in self.sampler.query(query)]}
+
+            total_cpu = self.sample_value(samples, "util")
+            if total_cpu is None:
                 print("[DEBUG CPU] Empty or null result from Prometheus")
-            return 0.0
+                return 0.0
+            # print(f"[DEBUG CPU] Extracted CPU value: {total_cpu}")
+            return total_cpu
         except Exception as e:
             print(f"[ERROR CPU] Error collecting CPU utilization for service {full_service_name}")
             print(f"[ERROR CPU] Error details: {str(e)}")
@@ -374,7 +489,7 @@ class Monitoring:
     def predict_users(self, horizon=1):
         """
         Predice il numero di utenti futuri basandosi sul gradiente medio degli ultimi 5 step.
-        Gestisce i valori None nella lista degli utenti attivi.
+        Gestisce i valori mancanti (NaN) nella serie degli utenti attivi.
 
         Args:
             horizon (int): Numero di step nel futuro per la predizione (default: 1)
@@ -382,17 +497,19 @@ class Monitoring:
         Returns:
             float: Numero predetto di utenti dopo 'horizon' step
         """
-        # Filtra i valori None dalla lista degli utenti attivi
-        valid_data = [(t, u) for t, u in zip(self.time, self.active_users) if u is not None]
+        # Filtra i valori mancanti (NaN) dalla serie degli utenti attivi
+        users = self.active_users.window()
+        valid = np.isfinite(users)
+        valid_times = self.time.window()[valid]
+        valid_users = users[valid]
 
-        if len(valid_data) < 5:
+        if len(valid_users) < 5:
             # Se non abbiamo abbastanza dati validi, ritorna l'ultimo valore valido o 0
-            return valid_data[-1][1] if valid_data else 0
+            return valid_users[-1] if len(valid_users) > 0 else 0
 
         # Prendi gli ultimi 5 valori validi
-        recent_data = valid_data[-5:]
-        recent_times = [t for t, _ in recent_data]
-        recent_users = [u for _, u in recent_data]
+        recent_times = valid_times[-5:]
+        recent_users = valid_users[-5:]
 
         # Calcola i gradienti per ogni coppia di punti consecutivi
         gradients = []
@@ -0,0 +1,118 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+# Label aggiunta ad ogni serie nella query combinata per poterla demultiplexare
+SAMPLE_LABEL = "soy_sample"
+
+
+class PromSampler:
+    """
+    Evaluates all the PromQL queries of a monitoring tick with a single round trip.
+
+    In "combined" mode every query is tagged with label_replace and the tagged
+    vectors are joined with `or`, so Prometheus answers all of them in one HTTP
+    request; results are split back by the tag label. In "concurrent" mode the
+    queries are sent in parallel over the same pooled keep-alive session.
+    If the combined query is rejected the sampler falls back to concurrent mode
+    for that tick.
+
+    `latency` always holds the duration of the whole tick under "__tick__".
+    Per-query timings exist only when the queries were sent separately
+    (concurrent mode or fallback): a combined request cannot time each query.
+    """
+
+    def __init__(self, url, mode="combined", timeout=2.0, pool_size=8):
+        self.url = url.rstrip("/") + "/api/v1/query"
+        self.mode = mode
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = None
+        # latenza (s) dell'ultimo campionamento: "__tick__" per il totale, per query solo in modalita' concorrente
+        self.latency = {}
+
+    def query(self, promql):
+        """
+        Runs one instant query and returns the raw result list.
+        """
+        response = self.session.post(self.url, data={"query": promql}, timeout=self.timeout)
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get("status") != "success":
+            raise RuntimeError(payload.get("error", "Prometheus query failed"))
+        return payload["data"]["result"]
+
+    def sample(self, queries):
+        """
+        Evaluates a set of named queries.
+
+        Args:
+            queries (dict): Mapping name -> PromQL expression
+
+        Returns:
+            dict: Mapping name -> list of (labels, value) tuples, one per returned series
+        """
+        if not queries:
+            return {}
+        st = time.perf_counter()
+        if self.mode == "combined":
+            try:
+                samples = self._sample_combined(queries)
+            except Exception as e:
+                print(f"[ERROR PROM] Combined query failed, falling back to concurrent mode: {str(e)}")
+                samples = self._sample_concurrent(queries)
+        else:
+            samples = self._sample_concurrent(queries)
+        self.latency["__tick__"] = time.perf_counter() - st
+        return samples
+
+    def _sample_combined(self, queries):
+        expr = " or ".join(f'label_replace({promql}, "{SAMPLE_LABEL}", "{name}", "", "")'
+                           for name, promql in queries.items())
+        result = self.query(expr)
+
+        samples = {name: [] for name in queries}
+        for series in result:
+            labels = dict(series.get("metric", {}))
+            name = labels.pop(SAMPLE_LABEL, None)
+            if name in samples:
+                samples[name].append((labels, float(series["value"][1])))
+        # una sola richiesta: nessuna latenza per query, solo quella del tick (impostata da sample)
+        self.latency = {}
+        return samples
+
+    def _timed_query(self, promql):
+        st = time.perf_counter()
+        try:
+            result = self.query(promql)
+        except Exception as e:
+            print(f"[ERROR PROM] Error querying '{promql}': {str(e)}")
+            result = []
+        return result, time.perf_counter() - st
+
+    def _sample_concurrent(self, queries):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+        names = list(queries.keys())
+        results = self.executor.map(self._timed_query, [queries[name] for name in names])
+
+        samples = {}
+        self.latency = {}
+        for name, (result, elapsed) in zip(names, results):
+            samples[name] = [(dict(series.get("metric", {})), float(series["value"][1])) for series in result]
+            self.latency[name] = elapsed
+        return samples
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.session.close()
+
+    def __str__(self):
+        return f"PromSampler(url={self.url}, mode={self.mode})"
@@ -4,12 +4,45 @@ Created on 31 mar 2021
 @author: emilio
 '''
 import casadi
+import numpy as np
 import time
 class QNEstimaator():
     
     model=None
     
     def estimate(self,rt,s,c):
+        """
+        Stima il service time e sull'intera finestra in forma chiusa.
+
+        Il modello di estimateIPOPT impone t_i = min(c_i/e, s_i/e) = min(c_i, s_i)/e e
+        minimizza sum (c_i - (rt_i+1)*t_i)^2. Con x = 1/e e a_i = (rt_i+1)*min(c_i, s_i)
+        diventa il problema ai minimi quadrati lineare sum (c_i - a_i*x)^2, la cui
+        soluzione x = (a.c)/(a.a) si calcola con operazioni vettoriali in O(n).
+
+        Args:
+            rt (array): Tempi di risposta
+            s (array): Core disponibili
+            c (array): Utenti
+
+        Returns:
+            float o None: Service time stimato, None se la finestra non contiene informazione
+        """
+        rt = np.asarray(rt, dtype=float).ravel()
+        s = np.asarray(s, dtype=float).ravel()
+        c = np.asarray(c, dtype=float).ravel()
+        valid = np.isfinite(rt) & np.isfinite(s) & np.isfinite(c)
+        a = (rt[valid]+1.0)*np.minimum(c[valid], s[valid])
+        den = np.dot(a, a)
+        num = np.dot(a, c[valid])
+        if den <= 0 or num <= 0:
+            return None
+        return den/num
+
+    def estimateIPOPT(self,rt,s,c):
+        """
+        Formulazione originale con un vincolo fmin per campione risolta con IPOPT.
+        Mantenuta come riferimento per estimate().
+        """
         self.model = casadi.Opti()
         #Ti=min(C/(1+e),s/e)
         e = self.model.variable(1,1);
@@ -42,4 +75,8 @@ if __name__ == '__main__':
     e=estimator.estimate(data["RtLine"][0:npoint,1],data["cores"][0:npoint,1], data["users"][:npoint,0])
     ctime=time.time()-st;
     print(e,ctime)
+    st=time.time()
+    e=estimator.estimateIPOPT(data["RtLine"][0:npoint,1],data["cores"][0:npoint,1], data["users"][:npoint,0])
+    ctime=time.time()-st;
+    print(e,ctime)
     
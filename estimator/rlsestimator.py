@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class RLSEstimator():
+    """
+    Stima online del service time con minimi quadrati ricorsivi (RLS) e fattore di oblio.
+
+    Usa la legge dell'utilizzazione util = e * tr: ad ogni tick il guadagno
+    corregge la stima con l'errore di predizione del nuovo campione, con costo
+    O(1) e memoria costante. Se util e' un vettore (un valore per servizio) si
+    stimano in parallelo i service time di tutti i servizi, che condividono il
+    throughput come regressore.
+    """
+
+    def __init__(self, forgetting=0.95, p0=1e3):
+        self.forgetting = forgetting
+        self.p0 = p0
+        self.reset()
+
+    def reset(self):
+        self.e = None
+        self.P = None
+        self.n = 0
+
+    def update(self, util, tr):
+        """
+        Aggiorna la stima con un nuovo campione.
+
+        Args:
+            util (float o array): Utilizzazione CPU (core occupati) per servizio
+            tr (float): Throughput del sistema
+
+        Returns:
+            float o numpy.ndarray o None: Stima corrente del service time
+        """
+        if util is None or tr is None or not np.isfinite(tr) or tr <= 0:
+            return self.value()
+        util = np.asarray(util, dtype=float)
+        if not np.all(np.isfinite(util)):
+            return self.value()
+
+        if self.e is None:
+            # inizializzazione con il primo rapporto util/tr
+            self.e = util/tr
+            self.P = np.full(util.shape, self.p0)
+        else:
+            k = self.P*tr/(self.forgetting + tr*self.P*tr)
+            self.e = self.e + k*(util - tr*self.e)
+            self.P = (self.P - k*tr*self.P)/self.forgetting
+        self.n += 1
+        return self.value()
+
+    def value(self):
+        if self.e is None:
+            return None
+        if self.e.ndim == 0:
+            return float(self.e)
+        return self.e.copy()
+
+    def __str__(self):
+        return f"RLSEstimator(forgetting={self.forgetting}, e={self.value()}, n={self.n})"
@@ -0,0 +1,138 @@
+import csv
+import math
+import numbers
+import os
+import time
+from pathlib import Path
+
+
+class StreamWriter():
+    """
+    Scrittore CSV append-only per i risultati del monitoring.
+
+    Ogni riga viene accodata ad un buffer limitato a flush_every righe e scritta
+    su disco appena il buffer e' pieno, quindi un crash perde al massimo
+    flush_every tick e il file puo' essere letto mentre il test e' in corso
+    (ad esempio con follow() o `tail -f`). Le colonne sono fissate all'apertura.
+    Con write_batch tutte le righe di un tick contano come un'unica unita' di flush.
+    Le colonne in integer_columns (es. repliche) sono scritte come interi, come
+    faceva DataFrame.to_csv sulle liste di interi.
+    """
+
+    def __init__(self, path, columns, flush_every=1, fsync=False, integer_columns=()):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.flush_every = max(1, int(flush_every))
+        self.fsync = fsync
+        self.integer_columns = set(integer_columns)
+        self.file = None
+        self.buffer = []
+        self.rows = 0
+        # scritture (righe o batch) accodate dall'ultimo flush
+        self.pending = 0
+        self.closed = False
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "w", newline="")
+        self.file.write(",".join(self.columns) + "\n")
+        self.file.flush()
+
+    def write(self, row):
+        """
+        Appends a row (dict column -> value). Missing values and NaN are written as empty fields.
+        """
+        self.write_batch([row])
+
+    def write_batch(self, rows):
+        """
+        Appends the rows of one tick; they are flushed together.
+        """
+        if self.file is None:
+            self.open()
+        for row in rows:
+            self.buffer.append(",".join(self.format(self.cast(column, row.get(column))) for column in self.columns))
+            self.rows += 1
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def cast(self, column, value):
+        # le colonne intere arrivano come float64 dallo store: NaN resta vuoto
+        if column in self.integer_columns and isinstance(value, numbers.Real) and math.isfinite(value):
+            return int(value)
+        return value
+
+    @staticmethod
+    def format(value):
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            # campi testuali (es. nome dell'endpoint), quotati solo se necessario
+            if any(c in value for c in ',"\n'):
+                return '"' + value.replace('"', '""') + '"'
+            return value
+        if isinstance(value, numbers.Integral):
+            return str(int(value))
+        value = float(value)
+        if value != value:
+            return ""
+        return repr(value)
+
+    def flush(self):
+        if self.file is None or not self.buffer:
+            return
+        self.file.write("\n".join(self.buffer) + "\n")
+        self.buffer = []
+        self.pending = 0
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.closed:
+            return
+        if self.file is None:
+            # run terminato prima del primo tick: il file esiste comunque con l'intestazione
+            self.open()
+        self.flush()
+        self.file.close()
+        self.file = None
+        self.closed = True
+
+    def __str__(self):
+        return f"StreamWriter(path={self.path}, rows={self.rows}, flush_every={self.flush_every})"
+
+
+def follow(path, poll=1.0, stop=None):
+    """
+    Legge un file scritto da StreamWriter mentre viene aggiornato.
+
+    Args:
+        path (str): Percorso del file CSV
+        poll (float): Attesa in secondi quando non ci sono nuove righe
+        stop (callable, optional): Se restituisce True la lettura termina appena il file e' esaurito
+
+    Yields:
+        dict: Una riga per tick (colonna -> stringa)
+    """
+    with open(path, newline="") as f:
+        header = None
+        pending = ""
+        while True:
+            chunk = f.readline()
+            if not chunk:
+                if stop is not None and stop():
+                    return
+                time.sleep(poll)
+                continue
+            pending += chunk
+            # riga non ancora completa: aspetta il resto
+            if not pending.endswith("\n"):
+                continue
+            line, pending = pending, ""
+            values = next(csv.reader([line]))
+            if header is None:
+                header = values
+                continue
+            yield dict(zip(header, values))
@@ -0,0 +1,182 @@
+import time
+import threading
+import docker
+
+
+class SwarmStateCache():
+    """
+    Stato dei servizi di uno stack swarm tenuto in memoria e aggiornato dallo
+    stream degli eventi docker.
+
+    All'avvio viene fatta una sincronizzazione completa (servizi, task in
+    esecuzione, salute dei container); poi un thread in background legge gli
+    eventi "service" e "container" e aggiorna solo il servizio interessato.
+    I lettori (Monitoring, ControlLoop) leggono dai dizionari in memoria senza
+    round trip verso il daemon. Lo stream viene riaperto ogni `resync` secondi
+    con una nuova sincronizzazione completa, che recupera eventi persi e task
+    su altri nodi (gli eventi dei container arrivano solo dal nodo interrogato).
+
+    Sotto Locust `threading` e' patchato da gevent: il listener va avviato
+    dal greenlet del control loop e diventa un greenlet con I/O cooperativo.
+    """
+
+    def __init__(self, client, stack_name, resync=30.0):
+        self.client = client
+        self.stack_name = stack_name
+        self.resync = resync
+        # nome completo -> oggetto Service del docker SDK
+        self.services = {}
+        # nome completo -> repliche desiderate
+        self.desired = {}
+        # nome completo -> {task id: {"running": bool, "healthy": bool}}
+        self.tasks = {}
+        self.thread = None
+        self.stream = None
+        self.running = False
+        self.since = None
+        self.events = 0
+        self.syncs = 0
+
+    def start(self):
+        self.sync()
+        self.running = True
+        self.thread = threading.Thread(target=self._listen, name="swarm-events", daemon=True)
+        self.thread.start()
+        return self
+
+    def sync(self):
+        """
+        Full refresh of the stack state: one call for the services, one per service
+        for its tasks and one for the health of all the stack containers.
+        """
+        since = int(time.time())
+        namespace = f"com.docker.stack.namespace={self.stack_name}"
+        services = {service.name: service for service in self.client.services.list(filters={"label": namespace})}
+        health = {}
+        for container in self.client.api.containers(filters={"label": namespace}):
+            labels = container.get("Labels") or {}
+            health[labels.get("com.docker.swarm.task.id")] = "(healthy)" in container.get("Status", "")
+        tasks = {}
+        for name in services:
+            running = self.client.api.tasks(filters={"service": name, "desired-state": "running"})
+            tasks[name] = {task["ID"]: {"running": True, "healthy": health.get(task["ID"], False)}
+                           for task in running if task.get("Status", {}).get("State") == "running"}
+        self.services = services
+        self.desired = {name: self.replicas_of(service) for name, service in services.items()}
+        self.tasks = tasks
+        self.since = since
+        self.syncs += 1
+
+    @staticmethod
+    def replicas_of(service):
+        return service.attrs['Spec']['Mode'].get('Replicated', {}).get('Replicas', 1)
+
+    def _listen(self):
+        while self.running:
+            try:
+                until = int(time.time() + self.resync)
+                self.stream = self.client.events(since=self.since, until=until, decode=True,
+                                                 filters={"type": ["service", "container"]})
+                for event in self.stream:
+                    self.since = event.get("time", self.since)
+                    self.handle(event)
+                if self.running:
+                    self.sync()
+            except Exception as e:
+                if not self.running:
+                    return
+                print(f"[ERROR SWARM] Event stream interrupted: {str(e)}")
+                time.sleep(1)
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"[ERROR SWARM] Resync failed: {str(e)}")
+
+    def handle(self, event):
+        """
+        Applies one docker event to the in-memory state.
+        """
+        self.events += 1
+        action = event.get("Action", "")
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        if event.get("Type") == "service":
+            name = attributes.get("name")
+            if not name or not name.startswith(f"{self.stack_name}_"):
+                return
+            if action == "remove":
+                self.services.pop(name, None)
+                self.desired.pop(name, None)
+                self.tasks.pop(name, None)
+            else:
+                # una sola chiamata per cambiamento, non per tick
+                service = self.client.services.get(name)
+                self.services[name] = service
+                self.desired[name] = self.replicas_of(service)
+                self.tasks.setdefault(name, {})
+        elif event.get("Type") == "container":
+            name = attributes.get("com.docker.swarm.service.name")
+            task_id = attributes.get("com.docker.swarm.task.id")
+            if name not in self.services or task_id is None:
+                return
+            # copia e sostituzione: i lettori in altri thread vedono sempre uno stato coerente
+            tasks = dict(self.tasks.get(name, {}))
+            if action == "start":
+                tasks[task_id] = {"running": True, "healthy": False}
+            elif action in ("die", "stop", "kill", "destroy"):
+                tasks.pop(task_id, None)
+            elif action.startswith("health_status") and task_id in tasks:
+                tasks[task_id] = {"running": True, "healthy": action == "health_status: healthy"}
+            else:
+                return
+            self.tasks[name] = tasks
+
+    def service(self, name):
+        """
+        Returns the cached docker Service object, or None if the service does not exist.
+        """
+        return self.services.get(name)
+
+    def replicas(self, name):
+        """
+        Returns the desired number of replicas, or None if the service does not exist.
+        """
+        return self.desired.get(name)
+
+    def running_tasks(self, name):
+        return len(self.tasks.get(name, {}))
+
+    def ready(self, name, health_check=False):
+        """
+        Returns the number of running tasks, counting only the healthy ones if health_check is set.
+        """
+        tasks = self.tasks.get(name, {})
+        if not health_check:
+            return len(tasks)
+        return sum(1 for task in tasks.values() if task["healthy"])
+
+    def scale(self, name, replicas):
+        """
+        Scales a service and records the new desired replicas immediately.
+        """
+        service = self.services.get(name)
+        if service is None:
+            raise docker.errors.NotFound(f"Service {name} not found")
+        try:
+            service.scale(replicas)
+        except docker.errors.APIError:
+            # versione del servizio non aggiornata: ricarica e riprova una volta
+            service.reload()
+            service.scale(replicas)
+        self.desired[name] = replicas
+
+    def close(self):
+        self.running = False
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+
+    def __str__(self):
+        return f"SwarmStateCache(stack={self.stack_name}, services={len(self.services)}, events={self.events}, syncs={self.syncs})"
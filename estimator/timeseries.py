@@ -0,0 +1,130 @@
+import json
+from pathlib import Path
+import numpy as np
+
+
+class RingBuffer():
+    """
+    Buffer circolare preallocato di float64 con memoria fissa.
+
+    Ogni valore viene scritto due volte (in i e in i+capacity), cosi' gli ultimi
+    n campioni sono sempre contigui e window(n) restituisce una vista senza copie.
+    Espone la parte di interfaccia delle liste usata da Monitoring e ControlLoop
+    (len, indici negativi, slicing, iterazione). I valori None diventano NaN.
+    """
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError(f"RingBuffer capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.data = np.full(2*capacity, np.nan)
+        self.count = 0
+
+    def append(self, value):
+        i = self.count % self.capacity
+        v = np.nan if value is None else float(value)
+        self.data[i] = v
+        self.data[i+self.capacity] = v
+        self.count += 1
+
+    def window(self, n=None):
+        """
+        Returns a read-only zero-copy view of the last n samples (all retained samples if None).
+        """
+        size = len(self)
+        n = size if n is None else max(0, min(n, size))
+        end = self.count % self.capacity + self.capacity
+        view = self.data[end-n:end]
+        view.flags.writeable = False
+        return view
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __getitem__(self, idx):
+        return self.window()[idx]
+
+    def __iter__(self):
+        return iter(self.window())
+
+    def __str__(self):
+        return f"RingBuffer(capacity={self.capacity}, count={self.count})"
+
+
+class TimeSeriesStore():
+    """
+    Insieme di colonne RingBuffer con la stessa capacita', aggiornate una riga alla volta.
+
+    Se spill_path e' impostato, ogni blocco di righe viene accodato su disco
+    (float64 grezzi, righe consecutive) prima di essere sovrascritto, cosi' la
+    storia completa resta disponibile tramite history() mentre la memoria resta
+    limitata a capacity righe. I nomi delle colonne sono salvati in <spill_path>.json.
+    """
+
+    def __init__(self, columns, capacity=21600, spill_path=None):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.buffers = {column: RingBuffer(capacity) for column in self.columns}
+        self.spill_path = None if spill_path is None else Path(spill_path)
+        self.count = 0
+        self.spilled = 0
+
+    def __getitem__(self, column):
+        return self.buffers[column]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, **values):
+        for column in self.columns:
+            self.buffers[column].append(values.get(column))
+        self.count += 1
+        # spill del blocco prima che la prossima riga lo sovrascriva
+        if self.spill_path is not None and self.count - self.spilled >= self.capacity:
+            self.spill()
+
+    def spill(self):
+        """
+        Appends the rows not yet written to the spill file.
+        """
+        if self.spill_path is None:
+            return
+        rows = self.count - self.spilled
+        if rows <= 0:
+            return
+        if self.spilled == 0:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(f"{self.spill_path}.json", "w") as header:
+                json.dump({"columns": self.columns, "dtype": "<f8"}, header)
+            # un file gia' esistente appartiene ad un run precedente
+            self.spill_path.write_bytes(b"")
+        block = np.column_stack([self.buffers[column].window(rows) for column in self.columns])
+        with open(self.spill_path, "ab") as f:
+            f.write(block.astype("<f8").tobytes())
+        self.spilled = self.count
+
+    def history(self):
+        """
+        Returns the full history as a dict column -> array, reading the spilled part from disk.
+        """
+        if self.spill_path is None or self.spilled == 0:
+            return {column: np.array(self.buffers[column].window()) for column in self.columns}
+        self.spill()
+        return load_spill(self.spill_path)
+
+    def __str__(self):
+        return f"TimeSeriesStore(columns={self.columns}, capacity={self.capacity}, count={self.count})"
+
+
+def load_spill(path):
+    """
+    Reads a file written by TimeSeriesStore.spill.
+
+    Returns:
+        dict: Mapping column -> numpy array
+    """
+    with open(f"{path}.json") as header:
+        meta = json.load(header)
+    columns = meta["columns"]
+    data = np.fromfile(path, dtype=meta["dtype"]).reshape(-1, len(columns))
+    return {column: data[:, i] for i, column in enumerate(columns)}
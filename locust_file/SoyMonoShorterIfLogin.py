@@ -6,30 +6,26 @@ import gevent
 import csv
 from pathlib import Path
 import time
-from base_exp import BaseExp,resourceDir
+from base_exp import BaseExp,OpenLoopExp,resourceDir,register_payload,get_payload
 from controller import ControlLoop
+from config.experiments import from_env
 import gevent
 
-cwd=Path(__file__).parent
+# Configurazione dell'esperimento passata da run_load_test.py --experiment
+# (una voce di config/experiments.yml, vedi config.experiments)
+exp_conf=from_env()
+register_payload(exp_conf["payload"])
+# "closed": utenti con think time (SoyMonoUser); "open": arrivi a tasso fissato (SoyMonoOpenUser)
+OPEN_LOOP=exp_conf.get("workload", "closed")=="open"
 
-exp_conf={ "service_name": "node",
-           "stack_name": "monotloth-stack",
-           "sysfile": cwd.parent/"sou"/"monotloth-v4.yml",
-           "control_widow": 1,
-           "estimation_window": 10,
-           "measurament_period":"1s",
-           "outfile":cwd.parent/"results"/f"{Path(__file__).stem}"/f"{Path(__file__).stem}.csv",
-           "stealth":False,
-           "init_repica":1,
-           "prediction_horizon":10,
-           "target_utilization":0.2,
-           "prometheus":{
-               "host":"192.168.3.102",
-               "port":9090
-           },
-           "remote":"192.168.3.102",
-           "remote_docker_port":2375
-         }
+# corpo del login serializzato una volta per utente di users.csv
+login_bodies={}
+def login_body(user_data):
+    body=login_bodies.get(user_data['email'])
+    if body is None:
+        body=login_bodies[user_data['email']]=json.dumps({"email": user_data['email'],
+                                                          "password": user_data['password']}).encode("utf-8")
+    return body
 
 #Qui la logica di avvio del control loop specifica per ogni locus file
 ctrlLoop=ControlLoop(config=exp_conf)
@@ -44,6 +40,7 @@ def on_locust_stop(environment, **_kwargs):
     ctrlLoop.saveResults()
 
 class SoyMonoUser(BaseExp):
+    abstract = OPEN_LOOP
 
     def request(self, method, url, **kwargs):
         kwargs.setdefault("timeout", 1)  # Timeout predefinito di 10 secondi
@@ -54,15 +51,13 @@ class SoyMonoUser(BaseExp):
 
     def userLogic(self):
         # Implementazione specifica della logica utente
-        email = self.user_data['email']
-        password = self.user_data['password']
         # OPTIONS before login
         self.client.request("OPTIONS", "/api/user/login", timeout=1)
         # Login
         login_response = self.client.post(
             "/api/user/login",
             headers={"Content-Type": "application/json"},
-            json={"email": email, "password": password},
+            data=login_body(self.user_data),
             timeout=1
         )
         if login_response.status_code == 200:
@@ -80,17 +75,15 @@ class SoyMonoUser(BaseExp):
                 # OPTIONS before exercise production
                 self.client.request("OPTIONS", "/api/exercise-production", timeout=1)
                 # Exercise production
-                with open(f'{resourceDir.absolute()}/soymono2/0046_request.json') as json_file:
-                    exercise_data = json.load(json_file)
-                    self.client.post(
-                        "/api/exercise-production",
-                        headers={
-                            "Authorization": f"Bearer {access_token}",
-                            "Content-Type": "application/json",
-                        },
-                        json=exercise_data,
-                        timeout=1
-                    )
+                self.client.post(
+                    "/api/exercise-production",
+                    headers={
+                        "Authorization": f"Bearer {access_token}",
+                        "Content-Type": "application/json",
+                    },
+                    data=get_payload(exp_conf["payload"]),
+                    timeout=1
+                )
                 # OPTIONS before logout
                 self.client.request("OPTIONS", "/api/user/logout", timeout=1)
                 # Logout
@@ -99,3 +92,16 @@ class SoyMonoUser(BaseExp):
                     headers={"Authorization": f"Bearer {access_token}"},
                     timeout=1
                 )
+
+class SoyMonoOpenUser(OpenLoopExp):
+    abstract = not OPEN_LOOP
+    arrival_rate = exp_conf.get("arrival_rate", 1.0)
+    arrivals = exp_conf.get("arrivals", "poisson")
+    arrival_trace = exp_conf.get("arrival_trace")
+    trace_time_column = exp_conf.get("trace_time_column", 0)
+    trace_time_scale = exp_conf.get("trace_time_scale", 1.0)
+    trace_loop = exp_conf.get("trace_loop", False)
+    max_in_flight = exp_conf.get("max_in_flight", 100)
+
+    # stesso flusso di login dell'utente a ciclo chiuso
+    userLogic = SoyMonoUser.userLogic
@@ -1,38 +1,170 @@
-from locust import HttpUser, task, between, LoadTestShape
+from locust import HttpUser, task, between, constant, LoadTestShape
 from locust import events
-from locust.runners import WorkerRunner
+from locust.runners import WorkerRunner, MasterRunner
+from locust.exception import StopUser
+from locust.clients import HttpSession
+from urllib3 import PoolManager
 import json
 import gevent
+from gevent.pool import Pool
+from gevent.local import local
 import csv
 from pathlib import Path
 import time
+import random
 from estimator import QNEstimaator
 from controller import OPTCTRL
 from estimator import Monitoring
 from controller import ControlLoop
-from prometheus_client import start_http_server, Counter, Summary, Gauge  # Aggiunta Gauge
+from config.experiments import METRICS_PORT_VAR, LATENCY_BUCKETS_VAR
+from prometheus_client import start_http_server, Counter, Histogram, Gauge  # Aggiunta Gauge
 import sys,argparse
+import os
 import base_exp
 from abc import ABC, abstractmethod
 from abc import ABCMeta, abstractmethod
 
-# Avvia il server Prometheus su porta 9646
-start_http_server(9646)
+# Porta base dell'exporter Prometheus: 9646 (o quella assegnata allo slot da run_experiments.py).
+# Il processo master (o quello singolo) usa la porta base, ogni worker la prima libera tra
+# base+1 e base+MAX_WORKERS; Prometheus le interroga tutte (vedi prometheus/prometheus.yml)
+METRICS_PORT = int(os.environ.get(METRICS_PORT_VAR, 9646))
+MAX_WORKERS = 8
 
 end = None
 
 # Metriche Prometheus
 REQUEST_COUNT = Counter('locust_requests_total', 'Total number of Locust requests')
-REQUEST_LATENCY = Summary('locust_request_latency_seconds', 'Request latency in seconds')
+# Bucket (s) degli istogrammi di latenza: SOY_LATENCY_BUCKETS="0.05,0.1,..." o quelli di default,
+# piu' fitti attorno alla SLA di 0.2s. Da _bucket Monitoring calcola i percentili (histogram_quantile)
+LATENCY_BUCKETS = tuple(float(b) for b in os.environ.get(LATENCY_BUCKETS_VAR, "").split(",") if b) or \
+    (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.125, 0.15, 0.175, 0.2, 0.25, 0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0)
+# Latenza dell'intera iterazione utente (userLogic)
+REQUEST_LATENCY = Histogram('locust_request_latency_seconds', 'Request latency in seconds', buckets=LATENCY_BUCKETS)
+# Latenza e conteggio di ogni singola richiesta HTTP, per metodo e nome (es. POST /api/user/login):
+# permettono di attribuire una regressione al singolo passo del flusso utente
+REQUEST_NAME_LATENCY = Histogram('locust_request_name_latency_seconds', 'Latency of each request in seconds',
+                                 ['method', 'name'], buckets=LATENCY_BUCKETS)
+REQUEST_NAME_COUNT = Counter('locust_request_name_total', 'Number of requests per endpoint',
+                             ['method', 'name', 'result'])
 # Nuovo Gauge per il numero totale di utenti attivi
 USER_COUNT = Gauge('locust_active_users', 'Total number of active Locust users')
 
+# Salute del generatore di carico: se il processo Locust e' saturo le RT misurate
+# riflettono la CPU del client e non il sistema sotto test
+LOOP_LAG = Gauge('locust_generator_loop_lag_seconds', 'Delay of the gevent event loop over the sampling period')
+GENERATOR_CPU = Gauge('locust_generator_cpu_percent', 'CPU usage of the Locust process')
+GREENLET_COUNT = Gauge('locust_generator_greenlets', 'Number of running user greenlets')
+OUTSTANDING = Gauge('locust_generator_outstanding_requests', 'Requests sent and not yet completed')
+SATURATED = Gauge('locust_generator_saturated', '1 when the load generator is saturated')
+
+# Carico a ciclo aperto (OpenLoopExp): arrivi generati e ritardo del dispatcher sul calendario degli arrivi
+ARRIVAL_COUNT = Counter('locust_open_loop_arrivals_total', 'Arrivals generated by the open-loop users')
+ARRIVAL_LAG = Gauge('locust_open_loop_lag_seconds', 'Delay of the open-loop dispatch over the intended arrival time')
+
+# Soglie di saturazione e periodo di campionamento della salute del generatore
+SATURATION_LAG = 0.1
+SATURATION_CPU = 90.0
+SATURATION_TOLERANCE = 0.05
+HEALTH_PERIOD = 1.0
+health = {"samples": 0, "saturated": 0}
+
+def monitor_generator(environment):
+    """
+    Misura periodicamente il ritardo dell'event loop (quanto in ritardo si sveglia
+    un gevent.sleep), la CPU del processo (misurata da Locust) e il numero di
+    greenlet utente, e segnala la saturazione del generatore.
+    """
+    while True:
+        st = time.perf_counter()
+        gevent.sleep(HEALTH_PERIOD)
+        lag = max(0.0, time.perf_counter() - st - HEALTH_PERIOD)
+        runner = environment.runner
+        cpu = getattr(runner, "current_cpu_usage", 0.0) if runner is not None else 0.0
+        greenlets = len(runner.user_greenlets) if runner is not None else 0
+        saturated = lag > SATURATION_LAG or cpu > SATURATION_CPU
+        LOOP_LAG.set(lag)
+        GENERATOR_CPU.set(cpu)
+        GREENLET_COUNT.set(greenlets)
+        SATURATED.set(1 if saturated else 0)
+        # il master non genera carico: la salute dei worker arriva tramite i messaggi di Locust
+        if runner is not None and not isinstance(runner, MasterRunner):
+            runner.send_message("generator_health", {"saturated": saturated})
+        if saturated:
+            print(f"[WARNING] Load generator saturated: loop lag {lag*1000:.1f} ms, CPU {cpu:.0f}%")
+
+def on_generator_health(environment, msg, **_kwargs):
+    # aggregazione sul master (o sul processo singolo) dei campioni di tutti i generatori
+    health["samples"] += 1
+    if msg.data["saturated"]:
+        health["saturated"] += 1
+
+def start_metrics_server(runner):
+    """
+    Avvia l'exporter Prometheus del processo e restituisce la porta usata.
+    """
+    if not isinstance(runner, WorkerRunner):
+        start_http_server(METRICS_PORT)
+        return METRICS_PORT
+    for port in range(METRICS_PORT + 1, METRICS_PORT + MAX_WORKERS + 1):
+        try:
+            start_http_server(port)
+            return port
+        except OSError:
+            continue
+    print(f"[WARNING] No free metrics port for this worker (more than {MAX_WORKERS} workers?)")
+    return None
+
+@events.init.add_listener
+def on_locust_init(environment, **_kwargs):
+    # L'exporter parte qui e non all'import: con --processes i worker sono fork del processo principale
+    port = start_metrics_server(environment.runner)
+    print(f"Prometheus metrics on port {port}")
+    if environment.runner is not None and not isinstance(environment.runner, WorkerRunner):
+        environment.runner.register_message("generator_health", on_generator_health)
+
 resourceDir=Path(__file__).parent.parent/Path("resources")
 
 users=None
+health_greenlet=None
+
+# Payload JSON delle richieste: percorso relativo a resources/ -> corpo gia' serializzato (bytes).
+# I locustfile registrano i payload all'import; vengono letti una sola volta a test_start
+# e condivisi da tutti gli utenti, che li inviano con data= senza ricodificarli.
+payloads = {}
+
+def register_payload(name):
+    """
+    Registra un payload da caricare a test_start.
+
+    Args:
+        name (str): Percorso del file JSON relativo a resources/
+    """
+    payloads.setdefault(name, None)
+
+def load_payload(name):
+    with open(resourceDir/name) as json_file:
+        # stessa serializzazione di requests con json=
+        return json.dumps(json.load(json_file)).encode("utf-8")
+
+def get_payload(name):
+    """
+    Restituisce il corpo serializzato del payload (caricato al primo uso se non registrato).
+    """
+    body = payloads.get(name)
+    if body is None:
+        body = payloads[name] = load_payload(name)
+    return body
+
+@events.request.add_listener
+def on_request(request_type, name, response_time, exception=None, **_kwargs):
+    # response_time di Locust e' in millisecondi
+    REQUEST_NAME_LATENCY.labels(method=request_type, name=name).observe(response_time/1000.0)
+    REQUEST_NAME_COUNT.labels(method=request_type, name=name,
+                              result="ok" if exception is None else "failure").inc()
+
 @events.test_start.add_listener
 def on_locust_start(environment, **_kwargs):
-    global end, users
+    global end, users, health_greenlet
     end = False
     # Salva il tempo di inizio in environment se non esiste
     if not hasattr(environment, "start_time"):
@@ -43,6 +175,65 @@ def on_locust_start(environment, **_kwargs):
         reader = csv.DictReader(csv_file)
         users = [row for row in reader]
 
+    # Carica una sola volta tutti i payload registrati
+    for name in payloads:
+        payloads[name] = load_payload(name)
+
+    # Salute del generatore, su ogni processo che genera carico
+    if health_greenlet is None:
+        health_greenlet = gevent.spawn(monitor_generator, environment)
+
+@events.quitting.add_listener
+def on_locust_quitting(environment, **_kwargs):
+    # Il run viene segnalato (exit code 3) se il generatore e' stato saturo troppo a lungo
+    if health["samples"] > 0 and health["saturated"] > SATURATION_TOLERANCE*health["samples"]:
+        print(f"[WARNING] Load generator saturated in {health['saturated']}/{health['samples']} samples: "
+              f"measured response times are not reliable")
+        environment.process_exit_code = 3
+
+def track_outstanding(client):
+    # Conta le richieste in corso (get/post/... passano tutte da client.request)
+    request = client.request
+    def tracked_request(*args, **kwargs):
+        OUTSTANDING.inc()
+        try:
+            return request(*args, **kwargs)
+        finally:
+            OUTSTANDING.dec()
+    client.request = tracked_request
+
+def next_user(cls):
+    """
+    Restituisce le credenziali del prossimo utente di users.csv (a rotazione).
+    """
+    user = users[cls.user_index % len(users)]
+    cls.user_index += 1
+    return user
+
+def trace_interarrivals(path, time_column=0, time_scale=1.0, loop=False):
+    """
+    Tempi di interarrivo (s) letti in streaming da una traccia di istanti di arrivo
+    (CSV, anche compresso, vedi loadshapes/trace_shape.py).
+
+    Args:
+        path (str): File della traccia
+        time_column (str|int): Nome o indice della colonna con gli istanti (secondi o date ISO)
+        time_scale (float): Secondi di traccia per secondo di test
+        loop (bool): Ricomincia dall'inizio quando la traccia finisce
+
+    Yields:
+        float: Attesa prima del prossimo arrivo
+    """
+    from loadshapes.trace_shape import read_trace
+    while True:
+        previous = None
+        for t in read_trace(path, time_column, users_column=None):
+            if previous is not None:
+                yield max(0.0, t - previous)/time_scale
+            previous = t
+        if not loop or previous is None:
+            return
+
 # Aggiungi una metaclasse combinata per risolvere il conflitto tra HttpUser e ABCMeta
 class CombinedMeta(ABCMeta, type(HttpUser)):
     pass
@@ -55,10 +246,9 @@ class BaseExp(HttpUser, metaclass=CombinedMeta):
     user_index = 0  # Static variable to keep track of user index
 
     def on_start(self):
-        global users
+        track_outstanding(self.client)
         # Assegna un ID univoco incrementale per ogni utente
-        self.user_data = users[self.__class__.user_index % len(users)]
-        self.__class__.user_index += 1
+        self.user_data = next_user(self.__class__)
         # Incrementa il Gauge all'avvio dell'utente
         USER_COUNT.inc()
 
@@ -85,3 +275,123 @@ class BaseExp(HttpUser, metaclass=CombinedMeta):
             pass
             #USER_COUNT.dec()  # Decrementa al termine
 
+
+class OpenLoopExp(HttpUser, metaclass=CombinedMeta):
+    """
+    Utente a ciclo aperto: invece di ripetere il flusso dopo il think time genera
+    arrivi ad un tasso obiettivo (Poisson o da una traccia di istanti di arrivo),
+    indipendentemente da quanto risponde il sistema. Ogni arrivo esegue userLogic
+    in un greenlet di un Pool limitato a max_in_flight; a pool pieno il dispatcher
+    aspetta uno slot ma il calendario degli arrivi resta quello previsto.
+
+    La latenza dell'iterazione (locust_request_latency_seconds) e' misurata
+    dall'istante di arrivo previsto e non dall'invio effettivo, quindi include
+    l'attesa di uno slot libero (correzione della coordinated omission).
+    locust_active_users conta le iterazioni in corso, cioe' la popolazione del sistema.
+
+    Ogni utente Locust e' una sorgente di arrivi indipendente: con N utenti
+    (ad esempio da una load shape) il tasso offerto e' N * arrival_rate.
+    Ogni arrivo usa una propria HttpSession (cookie separati, come un client
+    indipendente): dentro userLogic self.client e self.user_data sono locali al
+    greenlet dell'arrivo. Le sessioni condividono il pool di connessioni dell'utente.
+    """
+    abstract = True
+    wait_time = constant(0)
+    # arrivi al secondo generati da ogni utente
+    arrival_rate = 1.0
+    # "poisson" (interarrivi esponenziali) o "trace" (istanti di arrivo da arrival_trace)
+    arrivals = "poisson"
+    arrival_trace = None
+    trace_time_column = 0
+    trace_time_scale = 1.0
+    trace_loop = False
+    # massimo numero di iterazioni in corso per utente
+    max_in_flight = 100
+    user_index = 0
+    # connessioni HTTP condivise dalle sessioni degli arrivi
+    connections = None
+
+    def __init__(self, *args, **kwargs):
+        # stato dell'arrivo in corso, locale al greenlet (sessione e credenziali)
+        self.local = local()
+        super().__init__(*args, **kwargs)
+
+    def on_start(self):
+        self.pool = Pool(self.max_in_flight)
+        if self.connections is None:
+            self.connections = PoolManager(maxsize=self.max_in_flight)
+
+    def on_stop(self):
+        self.pool.kill()
+
+    @property
+    def client(self):
+        return getattr(self.local, "client", None) or self.__dict__["client"]
+
+    @client.setter
+    def client(self, session):
+        # sessione dell'utente (creata da HttpUser), usata fuori dagli arrivi
+        self.__dict__["client"] = session
+
+    @property
+    def user_data(self):
+        return self.local.user_data
+
+    def session(self):
+        """
+        Crea la sessione HTTP di un arrivo, con un proprio cookie jar.
+        """
+        session = HttpSession(base_url=self.host, request_event=self.environment.events.request,
+                              user=self, pool_manager=self.connections)
+        session.trust_env = False
+        track_outstanding(session)
+        return session
+
+    def interarrivals(self):
+        if self.arrivals == "poisson":
+            while True:
+                yield random.expovariate(self.arrival_rate)
+        elif self.arrivals == "trace":
+            yield from trace_interarrivals(self.arrival_trace, self.trace_time_column,
+                                           self.trace_time_scale, self.trace_loop)
+        else:
+            raise ValueError(f"Unknown arrival process: {self.arrivals}")
+
+    @abstractmethod
+    def userLogic(self):
+        """
+        Flusso eseguito ad ogni arrivo.
+        """
+        pass
+
+    @task
+    def dispatch(self):
+        intended = time.perf_counter()
+        for gap in self.interarrivals():
+            intended += gap
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                gevent.sleep(delay)
+            ARRIVAL_LAG.set(max(0.0, -delay))
+            # attende uno slot libero se ci sono gia' max_in_flight iterazioni in corso
+            self.pool.spawn(self.arrival, intended)
+            ARRIVAL_COUNT.inc()
+        # traccia finita: l'utente termina dopo le iterazioni in corso
+        self.pool.join()
+        raise StopUser()
+
+    def arrival(self, intended):
+        self.local.user_data = next_user(self.__class__)
+        self.local.client = self.session()
+        USER_COUNT.inc()
+        try:
+            self.userLogic()
+            REQUEST_COUNT.inc()
+        except Exception as e:
+            # fuori dal task di Locust: l'errore va segnalato esplicitamente
+            self.environment.events.user_error.fire(user_instance=self, exception=e, tb=e.__traceback__)
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - intended)
+            USER_COUNT.dec()
+            # niente close(): chiuderebbe il pool di connessioni condiviso
+            del self.local.client
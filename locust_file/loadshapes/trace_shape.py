@@ -0,0 +1,171 @@
+from locust import LoadTestShape
+from datetime import datetime
+from pathlib import Path
+import bz2
+import csv
+import gzip
+import io
+import itertools
+import lzma
+import os
+
+# Apertura in testo dei file compressi, scelta dall'estensione
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open, ".lzma": lzma.open}
+
+
+def open_trace(path):
+    opener = OPENERS.get(Path(path).suffix.lower())
+    if opener is None:
+        return open(path, newline="", buffering=1 << 20)
+    return io.TextIOWrapper(io.BufferedReader(opener(path, "rb"), buffer_size=1 << 20), newline="")
+
+
+def parse_time(value):
+    """
+    Converts a trace timestamp to seconds: a number (seconds) or an ISO 8601 date.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+
+
+def read_trace(path, time_column=0, users_column=1):
+    """
+    Legge una traccia riga per riga senza caricarla in memoria.
+
+    Args:
+        path (str): File CSV, eventualmente compresso (.gz, .bz2, .xz)
+        time_column (str|int): Nome o indice della colonna del tempo
+        users_column (str|int, optional): Nome o indice della colonna degli utenti;
+            None per le tracce di soli istanti (es. arrivi)
+
+    Yields:
+        tuple: (secondi dall'inizio della traccia, utenti), oppure solo i secondi se users_column e' None
+    """
+    with open_trace(path) as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [c.strip() for c in first]
+        time_index = header.index(str(time_column)) if str(time_column) in header else int(time_column)
+        users_index = None
+        if users_column is not None:
+            users_index = header.index(str(users_column)) if str(users_column) in header else int(users_column)
+        try:
+            # l'intestazione si riconosce dalla sola colonna del tempo
+            parse_time(first[time_index])
+            # nessuna intestazione: la prima riga e' gia' un campione
+            reader = itertools.chain([first], reader)
+        except ValueError:
+            pass
+        start = None
+        for row in reader:
+            if not row or not row[time_index].strip():
+                continue
+            t = parse_time(row[time_index])
+            if start is None:
+                start = t
+            if users_index is None:
+                yield t - start
+            else:
+                yield t - start, float(row[users_index])
+
+
+class CustomLoadShape(LoadTestShape):
+    """
+    A load shape that replays a user-count time series (e.g. a production trace).
+
+    The trace is streamed lazily: only the two samples around the current time are kept,
+    so multi-day traces can be replayed without loading them into memory. Between two
+    samples the user count is interpolated linearly (or held, with interpolation "step").
+    Every attribute can be overridden with the corresponding SOY_TRACE_* environment variable.
+    """
+    # CSV (anche .gz, .bz2, .xz) con una colonna di tempo (secondi o data ISO) e una di utenti
+    trace_file = os.environ.get("SOY_TRACE", "")
+    time_column = os.environ.get("SOY_TRACE_TIME_COLUMN", "0")
+    users_column = os.environ.get("SOY_TRACE_USERS_COLUMN", "1")
+    # secondi di traccia per secondo di test (es. 60: un minuto di traccia in un secondo)
+    time_scale = float(os.environ.get("SOY_TRACE_TIME_SCALE", 1.0))
+    # fattore applicato al numero di utenti della traccia
+    users_scale = float(os.environ.get("SOY_TRACE_USERS_SCALE", 1.0))
+    interpolation = os.environ.get("SOY_TRACE_INTERPOLATION", "linear")
+    # ricomincia dall'inizio quando la traccia finisce, altrimenti il test termina
+    loop = os.environ.get("SOY_TRACE_LOOP", "0").lower() in ("1", "true", "yes")
+    # durata massima del test in secondi (0: fino alla fine della traccia)
+    max_duration = float(os.environ.get("SOY_TRACE_MAX_DURATION", 0))
+    min_spawn_rate = 1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.trace_file:
+            raise ValueError("No trace file: set SOY_TRACE or CustomLoadShape.trace_file")
+        if self.interpolation not in ("linear", "step"):
+            raise ValueError(f"Unknown trace interpolation: {self.interpolation}")
+        if self.time_scale <= 0:
+            raise ValueError(f"Trace time scale must be positive, got {self.time_scale}")
+        self.rewind()
+
+    def rewind(self):
+        """
+        Riapre la traccia dall'inizio (a inizio test o quando il tempo torna indietro).
+        """
+        self.samples = read_trace(self.trace_file, self.time_column, self.users_column)
+        # offset dei giri gia' completati, in secondi di traccia
+        self.offset = 0.0
+        self.period = None
+        self.gap = 0.0
+        self.previous = next(self.samples, None)
+        if self.previous is None:
+            raise ValueError(f"Trace {self.trace_file} is empty")
+        self.next = next(self.samples, None)
+
+    def advance(self, trace_time):
+        """
+        Avanza lo stream finche' trace_time cade tra previous e next.
+
+        Returns:
+            bool: False se la traccia e' finita (e il loop non e' attivo)
+        """
+        while True:
+            while self.next is not None and self.next[0] + self.offset <= trace_time:
+                self.gap = self.next[0] - self.previous[0]
+                self.previous, self.next = self.next, next(self.samples, None)
+            if self.next is not None:
+                return True
+            if not self.loop:
+                return trace_time <= self.previous[0] + self.offset
+            # fine del giro: il primo campione del giro successivo segue l'ultimo
+            # dopo lo stesso intervallo degli ultimi due campioni
+            if self.period is None:
+                self.period = self.previous[0] + self.gap
+            if self.period <= 0:
+                return True
+            offset = self.offset + self.period
+            self.samples = read_trace(self.trace_file, self.time_column, self.users_column)
+            # l'ultimo campione del giro precedente raccorda con il primo del successivo
+            self.previous = (self.previous[0] + self.offset - offset, self.previous[1])
+            self.next, self.offset = next(self.samples), offset
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if self.max_duration and run_time > self.max_duration:
+            return None
+        trace_time = run_time*self.time_scale
+        if trace_time < self.previous[0] + self.offset:
+            self.rewind()
+        if not self.advance(trace_time):
+            return None  # End of the trace
+
+        t0, users0 = self.previous[0] + self.offset, self.previous[1]
+        if self.next is None:
+            return max(0, round(users0*self.users_scale)), self.min_spawn_rate
+        t1, users1 = self.next[0] + self.offset, self.next[1]
+        if self.interpolation == "step" or t1 <= t0:
+            users = users0
+        else:
+            users = users0 + (users1 - users0)*(trace_time - t0)/(t1 - t0)
+        # velocita' di spawn pari alla pendenza della traccia in tempo di test
+        slope = abs(users1 - users0)*self.users_scale*self.time_scale/max(t1 - t0, 1e-9)
+        return max(0, round(users*self.users_scale)), max(self.min_spawn_rate, slope)
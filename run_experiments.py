@@ -0,0 +1,348 @@
+import subprocess
+import argparse
+import logging
+import threading
+import queue
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import yaml
+from config import experiments
+
+# Configura il logger
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s")
+
+rootDir = Path(__file__).parent
+# porta di default dell'exporter Prometheus di Locust (vedi locust_file/base_exp.py)
+METRICS_PORT = 9646
+# porte dei worker Locust: METRICS_PORT+1 .. METRICS_PORT+METRICS_WORKERS
+METRICS_WORKERS = 8
+# exit code di run_load_test.py quando il generatore di carico e' saturo
+GENERATOR_SATURATED = 3
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the experiment matrix on parallel isolated stacks")
+    parser.add_argument("--loadshape-file", type=str, required=True,
+                        help="Path of the file that defines the LoadShape to be used.")
+    parser.add_argument("--matrix", type=str, default=str(experiments.matrixFile), help="Experiment matrix file")
+    parser.add_argument("--select", type=str, default=None, help="Regex selecting the experiments to run")
+    parser.add_argument("--hosts", type=str, default=None,
+                        help="Comma separated docker hosts (ssh); default: the local docker daemon")
+    parser.add_argument("--slots", type=int, default=1, help="Concurrent experiments per host")
+    parser.add_argument("--port-stride", type=int, default=100, help="Port offset between slots on the same host")
+    parser.add_argument("--app-port", type=int, default=5001, help="Published port of the application under test")
+    parser.add_argument("--results", type=str, default=None,
+                        help="Results directory (reuse it to resume a sweep); default results/<date>")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Run again the experiments that failed or saturated the load generator")
+    parser.add_argument("--users", type=int, default=1, help="Number of users (LOCUST_USERS)")
+    parser.add_argument("--spawn-rate", type=int, default=100, help="User spawn speed")
+    parser.add_argument("--run-time", type=str, default="3m", help="Test execution time")
+    parser.add_argument("--workers", type=int, default=0, help="Locust worker processes per experiment")
+    parser.add_argument("--quiet-load", type=float, default=0.2,
+                        help="Host load (1 min load average per CPU) below which the host is quiescent")
+    parser.add_argument("--quiet-timeout", type=float, default=180, help="Maximum wait for quiescence (s)")
+    parser.add_argument("--no-init", action="store_true", help="Do not re-init the swarm on the hosts")
+    parser.add_argument("--warm", action="store_true",
+                        help="Keep each slot's stack running between experiments (see run_load_test.py --warm)")
+    parser.add_argument("--reset-cmd", type=str, default=None,
+                        help="Shell command resetting the application state between warm experiments")
+    return parser.parse_args()
+
+
+def remote_cmd(host, *cmd):
+    """
+    Prefissa il comando con ssh se l'host e' remoto (stessa convenzione di run_load_test.py).
+    """
+    if host:
+        return ["ssh", host] + list(cmd)
+    return list(cmd)
+
+
+class ExperimentState():
+    """
+    Stato di completamento degli esperimenti salvato in <results>/state.json.
+
+    Ogni esperimento ha status "running", "done", "failed" o "saturated"
+    (generatore di carico saturo, risultati non affidabili); il file viene
+    riscritto atomicamente ad ogni cambiamento, quindi uno sweep interrotto
+    puo' essere ripreso rilanciando lo scheduler sulla stessa cartella.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def status(self, name):
+        return self.entries.get(name, {}).get("status")
+
+    def update(self, name, **values):
+        with self.lock:
+            self.entries.setdefault(name, {}).update(values)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp, self.path)
+
+
+class Slot():
+    """
+    Ambiente isolato su cui gira un esperimento alla volta: host docker,
+    nome della stack e offset delle porte pubblicate (applicazione, Prometheus,
+    cAdvisor, exporter Locust).
+    """
+
+    def __init__(self, host, index, stride):
+        self.host = host
+        self.index = index
+        self.offset = index*stride
+        self.name = f"{host or 'local'}-{index}"
+        # stack deployate sullo slot (rimosse a fine sweep in modalita' warm)
+        self.stacks = set()
+
+    def stack_name(self, conf):
+        return f"{conf['stack_name']}-s{self.index}"
+
+    def shift(self, port):
+        return int(port) + self.offset
+
+    def __str__(self):
+        return f"Slot({self.name}, offset={self.offset})"
+
+
+def shift_ports(ports, slot):
+    shifted = []
+    for port in ports:
+        if isinstance(port, dict):
+            port = dict(port)
+            port["published"] = slot.shift(port["published"])
+        else:
+            published, _, target = str(port).rpartition(":")
+            port = f"{slot.shift(published)}:{target}" if published else port
+        shifted.append(port)
+    return shifted
+
+
+def absolute(path, base):
+    return str((base/path).resolve()) if path.startswith(".") else path
+
+
+def write_stack(conf, slot, outdir):
+    """
+    Genera il file della stack e la configurazione di Prometheus per uno slot.
+    Il file originale in sou/ non viene modificato: le repliche del servizio,
+    le porte pubblicate e i percorsi relativi sono riscritti nella copia.
+
+    Returns:
+        Path: Percorso del file della stack generato
+    """
+    sysfile = Path(conf["sysfile"])
+    base = sysfile.parent
+    outdir.mkdir(parents=True, exist_ok=True)
+    with open(sysfile) as f:
+        stack = yaml.safe_load(f)
+
+    for name, service in stack.get("services", {}).items():
+        if name == conf["service_name"]:
+            service.setdefault("deploy", {})["replicas"] = conf["replicas"]
+        if "ports" in service:
+            service["ports"] = shift_ports(service["ports"], slot)
+        env_file = service.get("env_file")
+        if isinstance(env_file, str):
+            service["env_file"] = absolute(env_file, base)
+        elif env_file:
+            service["env_file"] = [absolute(e, base) for e in env_file]
+        volumes = []
+        for volume in service.get("volumes", []):
+            if isinstance(volume, str) and ":" in volume:
+                source, _, rest = volume.partition(":")
+                if rest.startswith("/etc/prometheus/prometheus.yml"):
+                    source = str(write_prometheus(absolute(source, base), slot, outdir))
+                volume = f"{absolute(source, base)}:{rest}"
+            volumes.append(volume)
+        if volumes:
+            service["volumes"] = volumes
+
+    path = outdir/f"stack-{slot.name}.yml"
+    with open(path, "w") as f:
+        yaml.safe_dump(stack, f, sort_keys=False)
+    return path
+
+
+def write_prometheus(source, slot, outdir):
+    # i target degli exporter Locust (master e worker) seguono le porte assegnate allo slot
+    with open(source) as f:
+        prom = yaml.safe_load(f)
+    def shift_target(target):
+        host, _, port = target.rpartition(":")
+        if port.isdigit() and METRICS_PORT <= int(port) <= METRICS_PORT + METRICS_WORKERS:
+            return f"{host}:{slot.shift(port)}"
+        return target
+    for job in prom.get("scrape_configs", []):
+        for static in job.get("static_configs", []):
+            static["targets"] = [shift_target(t) for t in static.get("targets", [])]
+    path = outdir/f"prometheus-{slot.name}.yml"
+    with open(path, "w") as f:
+        yaml.safe_dump(prom, f, sort_keys=False)
+    return path
+
+
+def run_command(cmd):
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
+def quiescent(slot, stack_name, quiet_load, warm=False):
+    """
+    The slot is quiescent when no container or network of its stack is left
+    (unless the stack is kept warm) and the host load per CPU is below quiet_load.
+    """
+    label = f"label=com.docker.stack.namespace={stack_name}"
+    for kind in (() if warm else ("ps", "network ls")):
+        result = run_command(remote_cmd(slot.host, "docker", *kind.split(), "-q", "--filter", label))
+        if result.returncode != 0 or result.stdout.strip():
+            return False
+    result = run_command(remote_cmd(slot.host, "sh", "-c", "cat /proc/loadavg; nproc"))
+    if result.returncode != 0:
+        return True
+    lines = result.stdout.split("\n")
+    return float(lines[0].split()[0])/max(1, int(lines[1])) < quiet_load
+
+
+def wait_quiescent(slot, stack_name, args):
+    st = time.time()
+    while time.time() - st < args.quiet_timeout:
+        if quiescent(slot, stack_name, args.quiet_load, warm=args.warm):
+            logging.info(f"{slot} quiescent after {time.time()-st:.1f}s")
+            return True
+        time.sleep(2)
+    logging.warning(f"{slot} not quiescent after {args.quiet_timeout}s, continuing")
+    return False
+
+
+def init_swarm(host):
+    logging.info(f"Init Docker Swarm on {host or 'local'}")
+    run_command(remote_cmd(host, "docker", "swarm", "leave", "--force"))
+    cmd = remote_cmd(host, "docker", "swarm", "init")
+    if host:
+        cmd += ["--advertise-addr", host]
+    subprocess.run(cmd, check=True)
+
+
+def run_experiment(name, slot, args, results, state):
+    conf = experiments.get_experiment(name, args.matrix)
+    outdir = results/name
+    outdir.mkdir(parents=True, exist_ok=True)
+    stack_name = slot.stack_name(conf)
+    slot.stacks.add(stack_name)
+    # in modalita' warm i file generati sono per slot, cosi' il redeploy non cambia la specifica dei servizi
+    stack_file = write_stack(conf, slot, results/"stacks" if args.warm else outdir)
+    overrides = [f"stack_name={stack_name}",
+                 f"sysfile={stack_file}",
+                 f"outfile={outdir/(name+'.csv')}",
+                 f"prometheus.port={slot.shift(conf['prometheus']['port'])}",
+                 f"metrics_port={slot.shift(METRICS_PORT)}"]
+    if slot.host:
+        overrides.append(f"prometheus.host={slot.host}")
+        if conf["remote"] is not None:
+            overrides.append(f"remote={slot.host}")
+
+    cmd = [sys.executable, str(rootDir/"run_load_test.py"),
+           "--users", str(args.users),
+           "--spawn-rate", str(args.spawn_rate),
+           "--run-time", args.run_time,
+           "--host", f"http://{slot.host or '127.0.0.1'}:{slot.shift(args.app_port)}",
+           "--csv", str(outdir/name),
+           "--experiment", name,
+           "--matrix", args.matrix,
+           "--loadshape-file", args.loadshape_file,
+           "--keep-swarm"]
+    if args.workers:
+        cmd += ["--workers", str(args.workers)]
+    if args.warm:
+        cmd += ["--warm"]
+        if args.reset_cmd:
+            cmd += ["--reset-cmd", args.reset_cmd]
+    if slot.host:
+        cmd += ["--remote", slot.host]
+    for override in overrides:
+        cmd += ["--override", override]
+
+    logging.info(f"Starting {name} on {slot} (stack {stack_name})")
+    state.update(name, status="running", slot=slot.name, start=time.time())
+    with open(outdir/"locust.log", "a") as log:
+        returncode = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT).returncode
+    status = {0: "done", GENERATOR_SATURATED: "saturated"}.get(returncode, "failed")
+    state.update(name, status=status, returncode=returncode, end=time.time())
+    logging.info(f"Finished {name} on {slot} (returncode={returncode})")
+    # il prossimo esperimento sullo slot parte solo quando la stack e' stata rimossa e l'host e' scarico
+    wait_quiescent(slot, stack_name, args)
+
+
+def worker(slot, jobs, args, results, state):
+    while True:
+        try:
+            name = jobs.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            run_experiment(name, slot, args, results, state)
+        except Exception as e:
+            logging.error(f"Error running {name} on {slot}: {str(e)}")
+            state.update(name, status="failed", error=str(e), end=time.time())
+
+
+def main():
+    args = parse_args()
+    results = Path(args.results or rootDir/"results"/datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+    results.mkdir(parents=True, exist_ok=True)
+    state = ExperimentState(results/"state.json")
+
+    names = sorted(experiments.load(args.matrix))
+    if args.select:
+        names = [n for n in names if re.search(args.select, n)]
+    skip = {"done", "failed", "saturated"} if not args.retry_failed else {"done"}
+    todo = [n for n in names if state.status(n) not in skip]
+    logging.info(f"{len(todo)} experiments to run, {len(names)-len(todo)} skipped (state in {state.path})")
+
+    hosts = args.hosts.split(",") if args.hosts else [None]
+    if not args.no_init:
+        for host in hosts:
+            init_swarm(host)
+    slots = [Slot(host, i, args.port_stride) for host in hosts for i in range(args.slots)]
+
+    jobs = queue.Queue()
+    for name in todo:
+        jobs.put(name)
+    threads = [threading.Thread(target=worker, args=(slot, jobs, args, results, state), name=slot.name)
+               for slot in slots]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if args.warm:
+        # le stack restano attive durante lo sweep: rimosse alla fine
+        for slot in slots:
+            for stack_name in slot.stacks:
+                run_command(remote_cmd(slot.host, "docker", "stack", "rm", stack_name))
+    failed = [n for n in names if state.status(n) == "failed"]
+    saturated = [n for n in names if state.status(n) == "saturated"]
+    logging.info(f"Sweep finished: {len(names)-len(failed)-len(saturated)} done, {len(failed)} failed, "
+                 f"{len(saturated)} with a saturated load generator")
+    if failed:
+        logging.info(f"Failed: {', '.join(failed)}")
+    if saturated:
+        logging.info(f"Saturated: {', '.join(saturated)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,13 +9,13 @@ import signal
 import sys
 import os  # Nuovo import
 import time
+import requests
 import re
+from config import experiments
 
 # Configura il logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-sys_base_path = Path(__file__).parent/"sou"
-
 # Variabili globali che verranno impostate dinamicamente
 stackName = None
 stackPath = None
@@ -23,61 +23,37 @@ stackPath = None
 # Variabile globale per salvare il processo Locust
 locust_process = None
 
+# Exit code di Locust quando il generatore di carico e' saturo
+GENERATOR_SATURATED = 3
+
 
-def load_config_from_locust_file(locust_file_path):
+def load_config_from_experiment(experiment, matrix=experiments.matrixFile):
     """
-    Carica la configurazione dal file locust specificato usando regex.
-    
+    Carica la configurazione dell'esperimento dalla matrice degli esperimenti.
+
     Args:
-        locust_file_path (str): Percorso del file locust
-        
+        experiment (str): Nome dell'esperimento (vedi `python -m config.experiments`)
+        matrix (str): Percorso del file della matrice
+
     Returns:
-        tuple: (stack_name, stack_path)
-        
+        tuple: (stack_name, stack_path, conf)
+
     Raises:
         ValueError: Se la configurazione non è valida
-        FileNotFoundError: Se il file locust non esiste
+        FileNotFoundError: Se il file della matrice non esiste
     """
+    if not Path(matrix).exists():
+        raise FileNotFoundError(f"Experiment matrix does not exist: {matrix}")
     try:
-        # Verifica che il file esista
-        if not Path(locust_file_path).exists():
-            raise FileNotFoundError(f"Locust file does not exist: {locust_file_path}")
-        
-        # Verifica che sia un file e non una directory
-        if not Path(locust_file_path).is_file():
-            raise ValueError(f"Path must be a file, not a directory: {locust_file_path}")
-        
-        # Legge il contenuto del file
-        with open(locust_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Estrae stack_name usando regex
-        stack_name_match = re.search(r'"stack_name":\s*"([^"]+)"', content)
-        if not stack_name_match:
-            raise ValueError(f"Could not find 'stack_name' in locust file: {locust_file_path}")
-        stack_name = stack_name_match.group(1)
-        
-        # Estrae sysfile usando regex - cerca il pattern "sysfile": .../"filename"
-        sysfile_match = re.search(r'"sysfile":\s*[^/]*/[^/]*/"([^"]+)"', content)
-        if not sysfile_match:
-            raise ValueError(f"Could not find 'sysfile' in locust file: {locust_file_path}")
-        
-        # Estrae direttamente il nome del file (senza virgolette)
-        sysfile_name = sysfile_match.group(1)
-        
-        # Costruisce il path completo usando sys_base_path
-        full_sysfile_path = sys_base_path / sysfile_name
-        
-        # Verifica che il file di sistema esista
-        if not full_sysfile_path.exists():
-            raise ValueError(f"System file does not exist: {full_sysfile_path}")
-        
-        return stack_name, full_sysfile_path
-        
-    except FileNotFoundError as e:
-        raise e
+        conf = experiments.get_experiment(experiment, matrix)
     except Exception as e:
-        raise ValueError(f"Error loading configuration from {locust_file_path}: {str(e)}")
+        raise ValueError(f"Error loading experiment {experiment} from {matrix}: {str(e)}")
+
+    # Verifica che il file di sistema esista
+    if not conf["sysfile"].exists():
+        raise ValueError(f"System file does not exist: {conf['sysfile']}")
+
+    return conf["stack_name"], conf["sysfile"], conf
 
 
 def parse_args():
@@ -87,10 +63,28 @@ def parse_args():
     parser.add_argument("--run-time", type=str, required=True, help="Test execution time")
     parser.add_argument("--host", type=str, required=True, help="Host to test")
     parser.add_argument("--csv", type=str, required=True, help="CSV file path for the results")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of Locust worker processes (0: single process). The control loop runs on the master")
     parser.add_argument("-r", "--remote", type=str, required=False, help="Remote host to test")
-    parser.add_argument("-f", "--locust-file", type=str, required=True, help="Locustfile path")
+    parser.add_argument("-e", "--experiment", type=str, required=True,
+                        help="Experiment name from the matrix (python -m config.experiments lists them)")
+    parser.add_argument("--matrix", type=str, default=str(experiments.matrixFile), help="Experiment matrix file")
+    parser.add_argument("-f", "--locust-file", type=str, default=str(Path(__file__).parent/"locust_file"/"SoyMonoShorterIfLogin.py"),
+                        help="Locustfile path (reads the experiment configuration from the environment)")
     parser.add_argument("--loadshape-file", type=str, required=True,
                         help="Path of the file that defines the LoadShape to be used.")
+    parser.add_argument("--override", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a configuration value of the experiment (repeatable, e.g. prometheus.port=9190)")
+    parser.add_argument("--ready-timeout", type=float, default=300,
+                        help="Maximum wait (s) for the stack to serve requests before starting Locust")
+    parser.add_argument("--ready-path", type=str, default="/",
+                        help="Path probed on --host to check that the application is serving")
+    parser.add_argument("--keep-swarm", action="store_true",
+                        help="Do not leave and re-init the swarm (other stacks may be running on it)")
+    parser.add_argument("--warm", action="store_true",
+                        help="Reuse the running swarm and stack: reset the application and scale it instead of redeploying, and keep the stack at the end")
+    parser.add_argument("--reset-cmd", type=str, default=None,
+                        help="Shell command run on the docker host to reset the application state in warm mode")
     return parser.parse_args()
 
 
@@ -149,6 +143,49 @@ def startSys(args):
     logging.info("Docker Swarm stack deployed successfully.")
 
 
+def remoteCmd(args, *cmd):
+    prefix = []
+    if args.remote:
+        prefix.append("ssh")
+        prefix.append(args.remote)
+    return prefix + list(cmd)
+
+
+def swarmActive(args):
+    result = subprocess.run(remoteCmd(args, "docker", "info", "--format", "{{.Swarm.LocalNodeState}}"),
+                            capture_output=True, text=True)
+    return result.stdout.strip() == "active"
+
+
+def stackDeployed(args):
+    result = subprocess.run(remoteCmd(args, "docker", "stack", "services", stackName, "-q"),
+                            capture_output=True, text=True)
+    return result.returncode == 0 and result.stdout.strip() != ""
+
+
+def warmSys(args, conf):
+    """
+    Riporta una stack gia' in esecuzione allo stato iniziale dell'esperimento senza
+    ridistribuirla: i servizi di infrastruttura (postgres, Prometheus, cAdvisor)
+    restano attivi, lo stato dell'applicazione viene azzerato e il servizio
+    controllato riparte con le repliche iniziali.
+    """
+    # deploy idempotente: aggiorna solo i servizi la cui specifica e' cambiata
+    startSys(args)
+    if args.reset_cmd:
+        logging.info(f"Resetting application state: {args.reset_cmd}")
+        subprocess.run(remoteCmd(args, "sh", "-c", args.reset_cmd), check=True)
+    service = f"{stackName}_{conf['service_name']}"
+    replicas = conf.get("replicas", conf.get("init_repica", 1))
+    logging.info(f"Restarting {service} with {replicas} replicas")
+    # --force riavvia i task (stato in memoria pulito), tutti insieme invece del rolling update.
+    # Senza --detach il comando ritorna solo quando l'aggiornamento e' completato: altrimenti
+    # wait_ready vedrebbe ancora i vecchi task N/N e Locust partirebbe durante il riavvio
+    subprocess.run(remoteCmd(args, "docker", "service", "update", "--force", "--quiet",
+                             "--replicas", str(replicas),
+                             "--update-parallelism", "0", "--update-delay", "0s", service), check=True)
+
+
 def stopSys(args):
     # Rimozione della stack Docker Swarm
     if stackName is None:
@@ -169,6 +206,63 @@ def stopSys(args):
     logging.info("Docker Swarm stack removed successfully.")
 
 
+def services_ready(args):
+    """
+    Verifica che tutti i servizi della stack abbiano tutti i task in esecuzione.
+
+    Returns:
+        bool: True se ogni servizio riporta repliche correnti == desiderate
+    """
+    cmd = []
+    if args.remote:
+        cmd.append("ssh")
+        cmd.append(args.remote)
+    cmd += ["docker", "stack", "services", stackName, "--format", "{{.Replicas}}"]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    lines = result.stdout.splitlines()
+    if result.returncode != 0 or not lines:
+        return False
+    for replicas in lines:
+        # formato "correnti/desiderate", eventualmente seguito da "(max N per node)"
+        match = re.match(r"\s*(\d+)/(\d+)", replicas)
+        if match is None or int(match.group(1)) < int(match.group(2)):
+            return False
+    return True
+
+
+def http_ready(url):
+    """
+    L'applicazione sta servendo se risponde con uno status diverso da 5xx.
+    """
+    try:
+        return requests.get(url, timeout=2).status_code < 500
+    except requests.RequestException:
+        return False
+
+
+def wait_ready(args):
+    """
+    Attende che la stack sia pronta: prima i task dei servizi in esecuzione, poi
+    la risposta HTTP dell'applicazione su --host, con backoff esponenziale.
+
+    Returns:
+        float: Tempo (s) trascorso fino a quando la stack e' pronta, None se scade --ready-timeout
+    """
+    url = args.host.rstrip("/") + args.ready_path
+    st = time.time()
+    delay = 0.5
+    tasks_ready = None
+    while time.time() - st < args.ready_timeout:
+        if tasks_ready is None and services_ready(args):
+            tasks_ready = time.time() - st
+            logging.info(f"All service tasks running after {tasks_ready:.1f}s")
+        if tasks_ready is not None and http_ready(url):
+            return time.time() - st
+        time.sleep(delay)
+        delay = min(delay*1.5, 5)
+    return None
+
+
 def handle_sigint(signum, frame):
     global locust_process
     logging.info("SIGINT received. Stopping system and killing child processes...")
@@ -195,10 +289,13 @@ def main():
     global locust_process, stackName, stackPath
     args = parse_args()
 
-    # Carica la configurazione dal file locust
+    # Carica la configurazione dell'esperimento dalla matrice
     try:
-        stackName, stackPath = load_config_from_locust_file(args.locust_file)
-        logging.info(f"Loaded configuration from locust file: stack_name='{stackName}', sysfile='{stackPath}'")
+        stackName, stackPath, conf = load_config_from_experiment(args.experiment, args.matrix)
+        if args.override:
+            conf = experiments.apply_overrides(conf, args.override)
+            stackName, stackPath = conf["stack_name"], conf["sysfile"]
+        logging.info(f"Loaded experiment '{args.experiment}': stack_name='{stackName}', sysfile='{stackPath}'")
     except (ValueError, FileNotFoundError) as e:
         logging.error(f"Configuration error: {e}")
         sys.exit(1)
@@ -214,24 +311,53 @@ def main():
         "--csv", args.csv,
         "-f", f"{args.locust_file},{args.loadshape_file}"  # Passa entrambi i file con una singola -f
     ]
+    if args.workers > 0:
+        # master + worker generati con fork: il carico scala oltre un core
+        cmd += ["--processes", str(args.workers)]
     logging.info(" ".join(cmd))
 
 
-    initSys(args)  # Deploy Docker Swarm stack
-    startSys(args)  # Deploy Docker Swarm stack
-    time.sleep(10)
+    if args.warm and stackDeployed(args):
+        warmSys(args, conf)  # Riusa swarm e stack gia' attivi
+    else:
+        if not (args.keep_swarm or (args.warm and swarmActive(args))):
+            initSys(args)  # Deploy Docker Swarm stack
+        startSys(args)  # Deploy Docker Swarm stack
+    # Locust parte appena la stack serve richieste (invece di un'attesa fissa)
+    ready = wait_ready(args)
+    if ready is None:
+        logging.error(f"Stack {stackName} not ready after {args.ready_timeout}s, aborting")
+        stopSys(args)
+        sys.exit(1)
+    logging.info(f"Stack {stackName} ready: time-to-ready {ready:.1f}s")
     logging.info("Starting Locust with command:")
 
     # Avvia il processo in un nuovo process group
+    # La configurazione arriva al locustfile tramite l'ambiente
+    env = dict(os.environ)
+    env[experiments.ENV_VAR] = experiments.to_env(conf)
+    env[experiments.METRICS_PORT_VAR] = str(conf.get("metrics_port", 9646))
+    if conf.get("latency_buckets"):
+        env[experiments.LATENCY_BUCKETS_VAR] = ",".join(str(b) for b in conf["latency_buckets"])
     locust_process = subprocess.Popen(
         cmd,
+        env=env,
         preexec_fn=os.setsid
         # stdout=subprocess.DEVNULL,
         # stderr=subprocess.DEVNULL
     )
-    locust_process.wait()
+    returncode = locust_process.wait()
     logging.info("Locust execution finished.")
-    stopSys(args)  # Stop della Docker Swarm stack
+    if not args.warm:
+        stopSys(args)  # Stop della Docker Swarm stack
+    # exit code 3: il generatore di carico e' stato saturo (vedi locust_file/base_exp.py)
+    if returncode == GENERATOR_SATURATED:
+        logging.warning("Load generator saturated during the run: results are flagged as unreliable")
+    elif returncode != 0:
+        logging.error(f"Locust failed with exit code {returncode}")
+    # run_experiments.py registra l'esperimento come fallito (o saturo) dall'exit code
+    if returncode != 0:
+        sys.exit(returncode)
 
 
 if __name__ == "__main__":
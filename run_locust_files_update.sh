@@ -12,27 +12,26 @@ LOADSHAPE_FILE="$1"
 
 # Stampa informazioni sull'esecuzione
 echo "LoadShape usage: $LOADSHAPE_FILE"
-echo "Starting batch tests for all locust files..."
+echo "Starting batch tests for all experiments..."
 
 current_date=$(date +"%Y-%m-%d_%H-%M-%S")
 
 #base_path="results/${current_date}"
 base_path="results"
-# Recupera tutti i file nella cartella locust_file il cui nome inizia per "SoyMonoShorterIfLogin"
+# Recupera tutti gli esperimenti definiti nella matrice config/experiments.yml
 
 curl --location 'https://measure.tasul.fr/api/measure/start/6802620805dedb7e0abf62fa'
-for file in locust_file/SoyMonoShorterIfLogin*.py; do
-    if [ -f "$file" ]; then
-        # Estrae l'intero successivo alla sottostringa "_x" nel nome del file (fino a prima di .py)
-        num=$(echo "$file" | grep -oP '(?<=_x).*?(?=\.py$)')
+for base in $(python3 -m config.experiments); do
+    if [ -n "$base" ]; then
+        # Repliche della stack definite per l'esperimento
+        num=$(python3 -m config.experiments --field "$base" replicas)
         [ -z "$num" ] && num=1  # Default se non trovato
 
         echo "replica to set $num"  # this correctly prints the extracted value if $num is set
 
-        base=$(basename "$file" .py)
         # Se la cartella "${base_path}/${base}" esiste già, salta l'esperimento.
         if [ -d "${base_path}/${base}" ]; then
-            echo "The folder ${base_path}/${base} already exists, skipping the experiment for $file."
+            echo "The folder ${base_path}/${base} already exists, skipping the experiment $base."
             continue
         fi
 
@@ -42,13 +41,13 @@ for file in locust_file/SoyMonoShorterIfLogin*.py; do
 
         csv_dir="${base_path}/${base}/${base}"
         mkdir -p "${base_path}/${base}"
-        echo "Execution of the test for: $file with replica $num, CSV in: $csv_dir"
+        echo "Execution of the test for: $base with replica $num, CSV in: $csv_dir"
 
-        curl --location 'https://measure.tasul.fr/api/measure/step/start/6802620805dedb7e0abf62fa?step='+$file
+        curl --location 'https://measure.tasul.fr/api/measure/step/start/6802620805dedb7e0abf62fa?step='+$base
         # Aggiorno il comando per passare anche il parametro loadshape-file
-        python3 run_load_test.py --remote 192.168.3.102 --users 1 --spawn-rate 100 --run-time 3m --host http://192.168.3.102:5001 --csv "$csv_dir" --locust-file "$file" --loadshape-file "$LOADSHAPE_FILE" >> "${base_path}/${base}/locust.log" 2>&1
+        python3 run_load_test.py --remote 192.168.3.102 --users 1 --spawn-rate 100 --run-time 3m --host http://192.168.3.102:5001 --csv "$csv_dir" --experiment "$base" --loadshape-file "$LOADSHAPE_FILE" >> "${base_path}/${base}/locust.log" 2>&1
         sleep 3m # aggiunto per attendere 3 minuti dopo l'esecuzione del test
-        curl --location 'https://measure.tasul.fr/api/measure/step/stop/6802620805dedb7e0abf62fa?step='+$file
+        curl --location 'https://measure.tasul.fr/api/measure/step/stop/6802620805dedb7e0abf62fa?step='+$base
         break
     fi
 done
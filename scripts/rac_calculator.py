@@ -5,14 +5,23 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import re
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 import matplotlib
 #matplotlib.use('Agg')  # Necessario per sistemi headless
 from scipy import stats  # Per fitting lineare
+# tabelle degli esperimenti lette una sola volta (Parquet se pyarrow e' installato)
+import results_store
+# stessa definizione di collo di bottiglia del control loop
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from estimator.endpoints import time_shares, bottleneck
 
 def calculate_rac(results_csv, theoretical_total):
     # Legge il file CSV aggregato contenente dati dal file SoyMonoShorterIfLogin_*_stats.csv
-    df = pd.read_csv(results_csv)
+    df = results_store.table(results_csv, "stats")
     df_no_last = df.iloc[:-1]  # Escludo l'ultima riga
     #print(df_no_last["Request Count"])
     ok_requests = df_no_last['Request Count'].sum()      # Somma delle richieste OK
@@ -29,10 +38,10 @@ def get_qnctrl_res(results_csv):
     if not data_file.exists():
         raise ValueError(f"Errore: File dati originale {data_file} non trovato")
 
-    return pd.read_csv(data_file)
+    return results_store.table(results_csv, "ctrl")
 
 def calulate_fr(results_csv):
-    df = pd.read_csv(results_csv)
+    df = results_store.table(results_csv, "stats")
     df_no_last = df.iloc[:-1]  # Escludo l'ultima riga
     #print(df_no_last["Request Count"])
     ok_requests = df_no_last['Request Count'].sum()      # Somma delle richieste OK
@@ -42,14 +51,14 @@ def calulate_fr(results_csv):
     return fr
 
 def compute_efr(results_csv, theoretical_total):
-    df = pd.read_csv(results_csv)
+    df = results_store.table(results_csv, "stats")
     df_no_last = df.iloc[:-1]  # Escludo l'ultima riga
     ko_requests = df_no_last['Failure Count'].sum()       # Somma delle richieste KO
     efr=ko_requests/(theoretical_total)
     return efr
 
 def compute_rt_dist(results_csv):
-    df = pd.read_csv(results_csv)
+    df = results_store.table(results_csv, "stats")
     df_no_last = df.iloc[:-1]  # Escludo l'ultima riga
     return df_no_last[["50%","75%","95%"]].sum()
 
@@ -59,13 +68,13 @@ def getavg_avg_replica(results_csv):
 
     #history file
     parent_dir = Path(results_csv).parent.name  # Nome della directory contenente il file
-    history=pd.read_csv(Path(results_csv).parent/f"{parent_dir}_stats_history.csv")
+    history=results_store.table(results_csv, "history")
     start=history["Timestamp"].min()
     end=history["Timestamp"].max()
     duration=end-start
 
     if("ctr" in results_csv):
-        ctrl_data=pd.read_csv(Path(results_csv).parent/f"{parent_dir}.csv")
+        ctrl_data=results_store.table(results_csv, "ctrl")
         rep=ctrl_data["replica"].mean()
         cumRep=ctrl_data["replica"].sum()
     else:
@@ -77,10 +86,54 @@ def getavg_avg_replica(results_csv):
     return rep,cumRep
 
 def get_sys_troughput(results_csv):
-    df = pd.read_csv(results_csv)
+    df = results_store.table(results_csv, "stats")
     df_no_last = df.iloc[:-1]  # Escludo l'ultima riga
     return df_no_last["Requests/s"].mean()
 
+def compute_endpoint_breakdown(results_csv):
+    """
+    Scompone latenza e throughput per endpoint (metodo e nome della richiesta).
+
+    Usa il file <esperimento>_endpoints.csv scritto da Monitoring ad ogni tick; se
+    non esiste (esperimenti precedenti) usa le righe per endpoint di *_stats.csv.
+    La colonna "share" e' la frazione del tempo di risposta totale spesa in
+    ciascun endpoint (rt * tr), che individua il passo che limita il flusso.
+
+    Args:
+        results_csv (str): Path al file CSV di statistiche (es. *_stats.csv)
+
+    Returns:
+        pandas.DataFrame: Indicizzato per (method, name) con colonne rt, p95, tr, failures, share
+    """
+    experiment_dir = Path(results_csv).parent
+    endpoints_file = experiment_dir / f"{experiment_dir.name}_endpoints.csv"
+    if endpoints_file.exists():
+        df = results_store.table(results_csv, "endpoints")
+        breakdown = df.groupby(["method", "name"])[["rt", "p95", "tr", "failures"]].mean()
+    else:
+        df = results_store.table(results_csv, "stats").iloc[:-1]  # Escludo la riga Aggregated
+        breakdown = pd.DataFrame({"method": df["Type"], "name": df["Name"],
+                                  "rt": df["Average Response Time"]/1000.0, "p95": df["95%"]/1000.0,
+                                  "tr": df["Requests/s"], "failures": df["Failures/s"]}).set_index(["method", "name"])
+    shares = time_shares(breakdown[["rt", "tr"]].to_dict("index"))
+    breakdown["share"] = [shares.get(key, np.nan) for key in breakdown.index]
+    return breakdown.sort_values(by="share", ascending=False)
+
+def get_bottleneck(results_csv):
+    """
+    Returns "METHOD name" of the endpoint with the largest share of response time, or None.
+    """
+    try:
+        breakdown = compute_endpoint_breakdown(results_csv)
+    except Exception as e:
+        print(f"Errore durante la scomposizione per endpoint di {results_csv}: {str(e)}")
+        return None
+    key = bottleneck(breakdown[["rt", "tr"]].to_dict("index"))
+    if key is None:
+        return None
+    method, name = key
+    return f"{method} {name}"
+
 def is_complete(results_csv):
     resPath=Path(results_csv)
     return (resPath.parent/f"{resPath.parent.name}.csv").exists()
@@ -141,7 +194,8 @@ def create_response_time_boxplot(results_dir, output_file=None):
     """
     # Trova tutti i file dati originali (non i file stats)
     data_files = glob.glob(os.path.join(results_dir, "**", "SoyMonoShorterIfLogin_*.csv"), recursive=True)
-    data_files = [f for f in data_files if not f.endswith('_stats.csv') and not f.endswith('_stats_history.csv')]
+    data_files = [f for f in data_files if not f.endswith('_stats.csv') and not f.endswith('_stats_history.csv')
+                  and not f.endswith('_endpoints.csv')]
     
     if not data_files:
         print("Nessun file dati trovato per creare il boxplot")
@@ -156,7 +210,7 @@ def create_response_time_boxplot(results_dir, output_file=None):
             exp_name = Path(file_path).parent.name
             
             # Leggi il file CSV
-            df = pd.read_csv(file_path)
+            df = results_store.table(file_path, "ctrl")
             print(df.columns)
             
             # Verifica che la colonna 'rts' esista
@@ -317,8 +371,8 @@ def get_cum_rep(results_csv):
         pandas.DataFrame: Dataframe originale con l'aggiunta della colonna 'cum_replica'
     """
     try:
-        # Recupera il dataframe dei dati originali
-        df = get_qnctrl_res(results_csv)
+        # Recupera il dataframe dei dati originali (copia: quello in cache e' condiviso)
+        df = get_qnctrl_res(results_csv).copy()
         
         # Verifica che la colonna 'replica' esista
         if 'replica' not in df.columns:
@@ -509,56 +563,153 @@ def predict_cum_replicas_for_experiment(results_csv, T):
         print(f"Errore durante la previsione per l'esperimento: {str(e)}")
         return None
 
+COLUMNS = ["CTRL","PRED","UTIL","INIT","RAC","FR","EFR","REP","∫REP","R/s","PRE_COST","50%","75%","95%","BOTTLENECK"]
+CACHE_FILE = "analysis_cache.json"
+# le righe in cache sono invalidate anche quando cambia il codice dell'analisi
+ANALYSIS_VERSION = hashlib.sha1(Path(__file__).read_bytes() + Path(results_store.__file__).read_bytes()).hexdigest()
+
+def analyze_experiment(csv_file, theoretical_total):
+    """
+    Calcola la riga della tabella riassuntiva di un esperimento (colonne COLUMNS).
+    Eseguita nei processi del pool da analyze_results.
+
+    Args:
+        csv_file (str): Path al file *_stats.csv dell'esperimento
+        theoretical_total (int): Numero teorico di richieste (N)
+
+    Returns:
+        list: Valori della riga
+    """
+    Pred=None
+    Util=None
+    Name=None
+
+    Init=None
+    Init=re.findall(r"_x[0-9]+_",csv_file)[0]
+    Init=re.findall(r"[0-9]+",string=Init)[0]
+
+    if("ctrl" in csv_file):
+        Name="Dynamic"
+        Util=re.findall(r"_[0-9]+\.[0-9]+_",csv_file)[0]
+        Util=re.findall(r"[0-9]+\.[0-9]+",Util)[0]
+        Pred=re.findall(r"_[0-9]+_",csv_file)[0]
+        Pred=re.findall(r"[0-9]+",Pred)[0]
+    else:
+        Name="Static"
+
+    rac_ok, rac_ko = calculate_rac(csv_file, theoretical_total)
+    fr = calulate_fr(csv_file)
+    efr = compute_efr(csv_file,theoretical_total)
+    rt_dist=compute_rt_dist(csv_file)
+    rep,cumRep=getavg_avg_replica(csv_file)
+    thr=get_sys_troughput(csv_file)
+    pre_cost=predict_cum_replicas_for_experiment(csv_file,180*60)
+
+    # Calcola l'integrale delle repliche
+    replica_integral = calculate_replica_integral(csv_file)
+
+    bottleneck=get_bottleneck(csv_file)
+
+    row=[Name,Pred,Util,Init,rac_ok+rac_ko,fr,
+         efr,rep,replica_integral,thr,pre_cost[0]]+rt_dist.tolist()+[bottleneck]
+    # tipi numpy -> tipi Python, per la cache JSON
+    return [v.item() if isinstance(v, np.generic) else v for v in row]
+
+def file_signature(path, previous=None):
+    """
+    Firma (mtime, size, sha1) di un file. Se mtime e dimensione coincidono con la
+    firma precedente l'hash non viene ricalcolato.
+    """
+    st = Path(path).stat()
+    if previous is not None and previous[0] == st.st_mtime and previous[1] == st.st_size:
+        return previous
+    return [st.st_mtime, st.st_size, hashlib.sha1(Path(path).read_bytes()).hexdigest()]
+
+def experiment_signature(csv_file, theoretical_total, previous=None):
+    files = results_store.source_files(Path(csv_file).parent)
+    previous_files = (previous or {}).get("files", {})
+    return {"version": ANALYSIS_VERSION, "theoretical_total": theoretical_total,
+            "files": {table: file_signature(path, previous_files.get(table)) for table, path in files.items()}}
+
+def same_inputs(a, b):
+    # confronto sugli hash: un file solo "toccato" (mtime diverso, stesso contenuto) resta in cache
+    return (a["version"] == b["version"] and a["theoretical_total"] == b["theoretical_total"] and
+            {t: f[2] for t, f in a["files"].items()} == {t: f[2] for t, f in b["files"].items()})
+
+def analyze_results(path, theoretical_total, workers=None, use_cache=True):
+    """
+    Analizza in parallelo tutti gli esperimenti completi sotto path e restituisce la
+    tabella riassuntiva. Le righe sono salvate in <path>/analysis_cache.json con la
+    firma (mtime, dimensione, sha1) dei file dell'esperimento: rilanciando l'analisi
+    vengono ricalcolati solo gli esperimenti nuovi o modificati.
+
+    Args:
+        path (str): Directory dei risultati
+        theoretical_total (int): Numero teorico di richieste (N)
+        workers (int, optional): Processi del pool (default: numero di CPU)
+        use_cache (bool): Se False ricalcola tutti gli esperimenti
+
+    Returns:
+        pandas.DataFrame: Una riga per esperimento (colonne COLUMNS)
+    """
+    cache_file = Path(path)/CACHE_FILE
+    cache = {}
+    if use_cache and cache_file.exists():
+        try:
+            cache = json.loads(cache_file.read_text())
+        except ValueError:
+            print(f"Cache {cache_file} non valida, ricalcolo tutti gli esperimenti")
+
+    csv_files = sorted(glob.glob(os.path.join(path, "**", "*_stats.csv"), recursive=True))
+    rows = {}
+    signatures = {}
+    todo = []
+    for csv_file in csv_files:
+        if(not is_complete(csv_file)):
+            print(f"Experiment {Path(csv_file).parent.name} is not complete")
+            continue
+        key = str(Path(csv_file).parent.relative_to(path))
+        cached = cache.get(key)
+        signatures[key] = experiment_signature(csv_file, theoretical_total, cached and cached["signature"])
+        if cached is not None and same_inputs(cached["signature"], signatures[key]):
+            rows[key] = cached["row"]
+        else:
+            todo.append((key, csv_file))
+
+    print(f"Experiments: {len(signatures)} ({len(rows)} cached, {len(todo)} to analyze)")
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {key: pool.submit(analyze_experiment, csv_file, theoretical_total) for key, csv_file in todo}
+            for key, future in futures.items():
+                try:
+                    rows[key] = future.result()
+                except Exception as e:
+                    print(f"Errore durante l'analisi di {key}: {str(e)}")
+        # indice degli esperimenti aggiornato con quelli nuovi (il Parquet e' gia' scritto dai worker)
+        results_store.build_index(path)
+
+    if use_cache:
+        cache = {key: {"signature": signatures[key], "row": row} for key, row in rows.items()}
+        tmp = cache_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cache, indent=1))
+        os.replace(tmp, cache_file)
+
+    return pd.DataFrame([rows[key] for key in sorted(rows)], columns=COLUMNS)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python rac_calculator.py <results_csv_or_directory>")
-        sys.exit(1)
-    path = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Compute the metrics of one experiment or of a results directory")
+    parser.add_argument("path", help="Results CSV (*_stats.csv) or directory")
+    parser.add_argument("--workers", type=int, default=None, help="Analysis processes (default: number of CPUs)")
+    parser.add_argument("--no-cache", action="store_true", help="Analyze every experiment again")
+    args = parser.parse_args()
+    path = args.path
     theoretical_total = 420254  # Use fixed N value as provided
 
     if os.path.isdir(path):
-        # Process all CSV files in subfolders of 'path'
-        csv_files = glob.glob(os.path.join(path, "**", "*_stats.csv"), recursive=True)
-        res=[]
-        for csv_file in csv_files:
-            if(is_complete(csv_file)):
-                Pred=None
-                Util=None
-                Name=None
-                
-                Init=None
-                Init=re.findall(r"_x[0-9]+_",csv_file)[0]
-                Init=re.findall(r"[0-9]+",string=Init)[0]
-
-                if("ctrl" in csv_file):
-                    Name="Dynamic"
-                    Util=re.findall(r"_[0-9]+\.[0-9]+_",csv_file)[0]
-                    Util=re.findall(r"[0-9]+\.[0-9]+",Util)[0]
-                    Pred=re.findall(r"_[0-9]+_",csv_file)[0]
-                    Pred=re.findall(r"[0-9]+",Pred)[0]
-                else:
-                    Name="Static"
-
-                rac_ok, rac_ko = calculate_rac(csv_file, theoretical_total)
-                fr = calulate_fr(csv_file)
-                efr = compute_efr(csv_file,theoretical_total)
-                rt_dist=compute_rt_dist(csv_file)
-                rep,cumRep=getavg_avg_replica(csv_file)
-                thr=get_sys_troughput(csv_file)
-                pre_cost=predict_cum_replicas_for_experiment(csv_file,180*60)
-
-                # Calcola l'integrale delle repliche
-                replica_integral = calculate_replica_integral(csv_file)
-                
-                res+=[[Name,Pred,Util,Init,rac_ok+rac_ko,fr,
-                       efr,rep,replica_integral,thr,pre_cost[0]]+rt_dist.tolist()]
-            else:
-                print(f"Experiment {Path(csv_file).parent.name} is not complete")
-
-        # Calcola la pendenza del modello lineare
-        df=pd.DataFrame(res,columns=["CTRL","PRED","UTIL","INIT","RAC","FR","EFR","REP","∫REP","R/s","PRE_COST","50%","75%","95%"])
+        # Analizza in parallelo gli esperimenti (solo quelli nuovi o modificati se in cache)
+        df=analyze_results(path, theoretical_total, workers=args.workers, use_cache=not args.no_cache)
         print(df.sort_values(by=['∫REP','50%','75%','95%'], ascending=[True, True, True, True]))
-        
+
         # Crea il boxplot dei tempi di risposta
         # output_file = os.path.join(path, "response_time_boxplot.png")
         # create_response_time_boxplot(path, output_file)
@@ -574,3 +725,5 @@ if __name__ == "__main__":
         if "_stats.csv" in path:
             replica_integral = calculate_replica_integral(path)
             print(f"Replica Integral: {replica_integral:.4f}")
+            print("Per-endpoint breakdown:")
+            print(compute_endpoint_breakdown(path))
@@ -0,0 +1,209 @@
+import sys
+import os
+import glob
+import json
+import pandas as pd
+from pathlib import Path
+
+# Tabelle di un esperimento: nome -> suffisso del file CSV nella directory <name>/
+TABLES = {
+    "stats": "_stats.csv",
+    "history": "_stats_history.csv",
+    "failures": "_failures.csv",
+    "ctrl": ".csv",
+    "endpoints": "_endpoints.csv",
+}
+STORE_SUFFIX = ".parquet"
+INDEX_FILE = "index"
+METADATA_KEY = b"soy_tables"
+
+# directory dell'esperimento -> (mtime del file colonnare, {tabella: DataFrame})
+_cache = {}
+
+
+def _pyarrow():
+    """
+    Returns (pyarrow, pyarrow.parquet), or None if pyarrow is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow, pyarrow.parquet
+    except ImportError:
+        return None
+
+
+def experiment_dir(results_csv):
+    """
+    Accepts an experiment directory or any of its files (e.g. *_stats.csv) and returns the directory.
+    """
+    path = Path(results_csv)
+    return path if path.is_dir() else path.parent
+
+
+def source_files(directory):
+    directory = Path(directory)
+    files = {}
+    for table, suffix in TABLES.items():
+        path = directory/f"{directory.name}{suffix}"
+        if path.exists():
+            files[table] = path
+    return files
+
+
+def store_path(directory):
+    directory = Path(directory)
+    return directory/f"{directory.name}{STORE_SUFFIX}"
+
+
+def read_csv(path):
+    """
+    Legge un CSV dei risultati convertendo in numeri le colonne che lo sono
+    (Locust scrive "N/A" nei percentili delle righe senza richieste).
+    """
+    df = pd.read_csv(path)
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].replace("N/A", None)
+        numeric = pd.to_numeric(values, errors="coerce")
+        if numeric.notna().sum() == values.notna().sum():
+            df[column] = numeric
+    return df
+
+
+def read_sources(directory):
+    return {table: read_csv(path) for table, path in source_files(directory).items()}
+
+
+def ingest(directory, force=False):
+    """
+    Converte i CSV di un esperimento in un unico file Parquet (<name>.parquet).
+
+    Le tabelle sono unite in un solo DataFrame con la colonna "table"; colonne e
+    tipi originali di ogni tabella sono salvati nei metadati dello schema, cosi' load()
+    restituisce ogni tabella con le colonne, i tipi e l'ordine delle righe dei CSV.
+    Il file viene riscritto solo se un CSV e' piu' recente (o con force).
+
+    Args:
+        directory (str): Directory dell'esperimento
+        force (bool): Riscrive il file anche se aggiornato
+
+    Returns:
+        Path: Percorso del file Parquet
+
+    Raises:
+        ImportError: Se pyarrow non e' installato
+    """
+    arrow = _pyarrow()
+    if arrow is None:
+        raise ImportError("pyarrow is required to write the columnar results store (pip install pyarrow)")
+    pa, pq = arrow
+    directory = Path(directory)
+    target = store_path(directory)
+    files = source_files(directory)
+    if not files:
+        raise ValueError(f"No results found in {directory}")
+    if (not force and target.exists() and
+            target.stat().st_mtime >= max(path.stat().st_mtime for path in files.values())):
+        return target
+    tables = read_sources(directory)
+    union = pd.concat([df.assign(table=table) for table, df in tables.items()], ignore_index=True, sort=False)
+    # colonne testuali in una tabella e numeriche in un'altra: salvate come testo
+    for column in union.columns[union.dtypes == object]:
+        if union[column].map(type).isin([int, float]).any():
+            union[column] = union[column].map(lambda v: v if pd.isna(v) else str(v))
+    arrow_table = pa.Table.from_pandas(union, preserve_index=False)
+    metadata = dict(arrow_table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({table: {column: str(dtype) for column, dtype in df.dtypes.items()}
+                                         for table, df in tables.items()}).encode()
+    tmp = target.with_suffix(".tmp")
+    pq.write_table(arrow_table.replace_schema_metadata(metadata), tmp)
+    os.replace(tmp, target)
+    return target
+
+
+def load(directory):
+    """
+    Restituisce le tabelle di un esperimento, lette una sola volta e tenute in cache.
+
+    Se pyarrow e' disponibile le tabelle vengono lette dal file Parquet (creato o
+    aggiornato da ingest() se necessario), altrimenti direttamente dai CSV.
+    I DataFrame restituiti sono condivisi: chi li modifica deve prima copiarli.
+
+    Args:
+        directory (str): Directory dell'esperimento o uno dei suoi file
+
+    Returns:
+        dict: Nome della tabella -> pandas.DataFrame
+    """
+    directory = experiment_dir(directory).resolve()
+    arrow = _pyarrow()
+    if arrow is None:
+        key = max((path.stat().st_mtime for path in source_files(directory).values()), default=None)
+        cached = _cache.get(directory)
+        if cached is None or cached[0] != key:
+            _cache[directory] = (key, read_sources(directory))
+        return _cache[directory][1]
+    target = ingest(directory)
+    key = target.stat().st_mtime
+    cached = _cache.get(directory)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    stored = arrow[1].read_table(target)
+    columns = json.loads(stored.schema.metadata[METADATA_KEY])
+    union = stored.to_pandas()
+    tables = {table: union[union["table"] == table][list(dtypes)].astype(dtypes).reset_index(drop=True)
+              for table, dtypes in columns.items()}
+    _cache[directory] = (key, tables)
+    return tables
+
+
+def table(results_csv, name):
+    """
+    Returns one table of the experiment that contains results_csv.
+
+    Raises:
+        ValueError: If the experiment has no such table
+    """
+    tables = load(results_csv)
+    if name not in tables:
+        directory = experiment_dir(results_csv)
+        raise ValueError(f"Errore: File {directory/(directory.name + TABLES[name])} non trovato")
+    return tables[name]
+
+
+def build_index(results_dir):
+    """
+    Ingerisce tutti gli esperimenti sotto results_dir e scrive un indice con una
+    riga per esperimento (index.parquet, o index.csv senza pyarrow).
+
+    Returns:
+        pandas.DataFrame: Indice degli esperimenti
+    """
+    rows = []
+    for stats in sorted(glob.glob(os.path.join(results_dir, "**", "*_stats.csv"), recursive=True)):
+        directory = Path(stats).parent
+        try:
+            tables = load(directory)
+        except Exception as e:
+            print(f"Errore durante l'ingest di {directory}: {str(e)}")
+            continue
+        history = tables.get("history")
+        rows.append({"experiment": directory.name,
+                     "path": str(directory),
+                     "complete": "ctrl" in tables,
+                     "start": history["Timestamp"].min() if history is not None else None,
+                     "end": history["Timestamp"].max() if history is not None else None,
+                     **{f"{name}_rows": len(df) for name, df in tables.items()}})
+    index = pd.DataFrame(rows)
+    if _pyarrow() is not None:
+        index.to_parquet(Path(results_dir)/f"{INDEX_FILE}{STORE_SUFFIX}", index=False)
+    else:
+        index.to_csv(Path(results_dir)/f"{INDEX_FILE}.csv", index=False)
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python results_store.py <results_directory>")
+        sys.exit(1)
+    print(build_index(sys.argv[1]).to_string())
@@ -0,0 +1,3 @@
+# locust applica il monkey-patching di gevent all'import: deve avvenire prima che
+# altri moduli (requests, urllib3) importino ssl, qualunque sia l'ordine dei test
+import locust  # noqa: F401
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+rootDir = Path(__file__).parent.parent
+sys.path.insert(0, str(rootDir))
+
+import run_experiments
+import run_load_test
+from config import experiments
+
+
+@pytest.fixture
+def fake_locust(tmp_path, monkeypatch):
+    """
+    Mette sul PATH un eseguibile `locust` che termina con l'exit code di $FAKE_LOCUST_EXIT,
+    e sostituisce le operazioni su docker di run_load_test.
+    """
+    bin_dir = tmp_path/"bin"
+    bin_dir.mkdir()
+    locust = bin_dir/"locust"
+    locust.write_text("#!/bin/sh\nexit ${FAKE_LOCUST_EXIT:-0}\n")
+    locust.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    for name in ("initSys", "startSys", "stopSys"):
+        monkeypatch.setattr(run_load_test, name, lambda args: None)
+    monkeypatch.setattr(run_load_test, "wait_ready", lambda args: 0.0)
+
+
+def run_in_process(cmd, **kwargs):
+    # esegue run_load_test.py nel processo del test, restituendo il suo exit code
+    argv = sys.argv
+    sys.argv = cmd[1:]
+    try:
+        run_load_test.main()
+        returncode = 0
+    except SystemExit as e:
+        returncode = e.code or 0
+    finally:
+        sys.argv = argv
+    return subprocess.CompletedProcess(cmd, returncode)
+
+
+@pytest.mark.parametrize("exit_code, status", [(0, "done"), (1, "failed"),
+                                               (run_experiments.GENERATOR_SATURATED, "saturated")])
+def test_locust_exit_code_is_recorded(tmp_path, monkeypatch, fake_locust, exit_code, status):
+    monkeypatch.setenv("FAKE_LOCUST_EXIT", str(exit_code))
+    monkeypatch.setattr(run_experiments, "write_stack", lambda conf, slot, outdir: outdir/"stack.yml")
+    monkeypatch.setattr(run_experiments, "wait_quiescent", lambda slot, stack_name, args: True)
+    monkeypatch.setattr(run_experiments.subprocess, "run", run_in_process)
+    name = sorted(experiments.load(experiments.matrixFile))[0]
+    args = Namespace(matrix=str(experiments.matrixFile), users=1, spawn_rate=1, run_time="1s",
+                     loadshape_file="shape.py", workers=0, warm=False, reset_cmd=None,
+                     app_port=5001, quiet_load=0.2, quiet_timeout=0)
+    state = run_experiments.ExperimentState(tmp_path/"state.json")
+    slot = run_experiments.Slot(None, 0, 100)
+
+    run_experiments.run_experiment(name, slot, args, tmp_path, state)
+
+    assert state.status(name) == status
+    assert state.entries[name]["returncode"] == exit_code
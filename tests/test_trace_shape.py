@@ -0,0 +1,33 @@
+import gzip
+import sys
+from pathlib import Path
+
+import pytest
+
+rootDir = Path(__file__).parent.parent
+sys.path.insert(0, str(rootDir))
+sys.path.insert(0, str(rootDir/"locust_file"))
+
+from loadshapes.trace_shape import read_trace
+from base_exp import trace_interarrivals
+
+
+ARRIVALS = ["2024-01-01T00:00:00", "2024-01-01T00:00:01", "2024-01-01T00:00:03", "2024-01-01T00:00:06"]
+
+
+@pytest.mark.parametrize("header", [True, False])
+def test_iso_arrival_trace(tmp_path, header):
+    path = tmp_path/"arrivals.csv.gz"
+    with gzip.open(path, "wt") as f:
+        if header:
+            f.write("timestamp\n")
+        f.write("\n".join(ARRIVALS) + "\n")
+    column = "timestamp" if header else 0
+    assert list(read_trace(path, column, users_column=None)) == [0.0, 1.0, 3.0, 6.0]
+    assert list(trace_interarrivals(path, column, time_scale=2.0)) == [0.5, 1.0, 1.5]
+
+
+def test_user_trace(tmp_path):
+    path = tmp_path/"users.csv"
+    path.write_text("time,users\n2024-01-01T00:00:00,10\n2024-01-01T00:01:00,20\n")
+    assert list(read_trace(path, "time", "users")) == [(0.0, 10.0), (60.0, 20.0)]